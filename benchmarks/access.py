@@ -0,0 +1,41 @@
+# benchmarks/access.py - Throughput of attribute access on structures.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+#
+# Usage: PYTHONPATH=. python benchmarks/access.py [COUNT]
+
+import sys
+import timeit
+
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+COUNT = int(sys.argv[1]) if 1 < len(sys.argv) else 200000
+
+class Header(sm.Struct, slots=True):
+    magic = sf.IntField(size=sf.IntField.Size.INT32)
+    caplen = sf.IntField(size=sf.IntField.Size.INT32)
+
+class Packet(sm.Struct, slots=True):
+    pkthdr = sf.SuperField(Header)
+    length = sf.IntField()
+    data = sf.ByteArrayField(length)
+
+packet = Packet(sd.Data(bytes(range(16))), 0)
+pkthdr = packet.pkthdr
+
+BENCHMARKS = [
+    ('field', lambda: packet.length),
+    ('nested field', lambda: packet.pkthdr.caplen),
+    ('field value', lambda: packet.length['value']),
+    ('field flags', lambda: packet.length['display_value:verbose']),
+    ('struct size', lambda: pkthdr._srddl['size']),
+    ('other attr', lambda: packet._srddl),
+]
+
+for name, func in BENCHMARKS:
+    elapsed = min(timeit.repeat(func, number=COUNT, repeat=3))
+    print('{:>13}: {:8.1f} ns, {:6.2f} M/s'.format(
+        name, elapsed / COUNT * 1e9, COUNT / elapsed / 1e6
+    ))
@@ -0,0 +1,52 @@
+# benchmarks/columns.py - Columnar export against walking bound values.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+#
+# Usage: PYTHONPATH=. python benchmarks/columns.py [COUNT]
+
+import struct
+import sys
+import time
+
+import srddl.core.helpers as sch
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+COUNT = int(sys.argv[1]) if 1 < len(sys.argv) else 100000
+
+class Timeval(sm.Struct, slots=True):
+    tv_sec = sf.IntField(size=sf.IntField.Size.INT32)
+    tv_usec = sf.IntField(size=sf.IntField.Size.INT32)
+
+class Record(sm.Struct, slots=True):
+    ts = sf.SuperField(Timeval)
+    caplen = sf.IntField(size=sf.IntField.Size.INT32)
+    length = sf.IntField(size=sf.IntField.Size.INT32)
+
+data = sd.Data(b''.join(struct.pack('<IIII', it, 0, it % 1500, 1500)
+                        for it in range(COUNT)))
+data.map_array(0, COUNT, Record)
+
+def walked():
+    return sum(s.caplen['value'] for s in data.mapped.values())
+
+def exported():
+    return sum(data.columns(Record)['caplen'])
+
+def timed(func):
+    begin = time.perf_counter()
+    res = func()
+    return res, time.perf_counter() - begin
+
+NUMPY_ON = sch.NUMPY_ON
+for name, func, numpy in [('walked', walked, False),
+                          ('columns', exported, False),
+                          ('numpy', exported, True)]:
+    if numpy and not NUMPY_ON:
+        continue
+    sch.NUMPY_ON, nb = numpy, len(data.mapped)
+    res, elapsed = timed(func)
+    print('{:>8}: {:8.2f} ms, {:6.0f} ns per record (sum {})'.format(
+        name, elapsed * 1e3, elapsed / nb * 1e9, res
+    ))
@@ -0,0 +1,54 @@
+# benchmarks/decoders.py - Generated decoders against mapped structures.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+#
+# Usage: PYTHONPATH=. python benchmarks/decoders.py [COUNT]
+
+import struct
+import sys
+import timeit
+
+import srddl.data as sd
+import srddl.decoders as sdec
+import srddl.fields as sf
+import srddl.models as sm
+
+COUNT = int(sys.argv[1]) if 1 < len(sys.argv) else 2000
+
+# Same structures as examples/ndh/steg200.py, with a switch on the chunks.
+class UnknownChunk(sm.Struct):
+    pad = sf.PaddingField(1)
+    length = sf.IntField(size=sf.IntField.Size.INT32)
+    data = sf.ByteArrayField(length)
+    kind = sf.IntField()
+    extra = sf.SwitchField(kind, {
+        0: sf.IntField(size=sf.IntField.Size.INT16),
+        sf.SwitchField.DEFAULT: sf.ByteArrayField(lambda s: s.length),
+    })
+
+class UnknownFile(sm.Struct):
+    pad = sf.PaddingField(1)
+    length = sf.IntField(size=sf.IntField.Size.INT32)
+    chunks = sf.ArrayField(length, sf.SuperField(UnknownChunk))
+
+buf = bytearray(b'\x00' + struct.pack('<I', COUNT))
+for it in range(COUNT):
+    buf += b'\x00' + struct.pack('<I', 8) + bytes(8) + bytes([it % 2])
+    buf += bytes(2 if it % 2 == 0 else 8)
+data = sd.Data(bytes(buf))
+
+def mapped():
+    f = UnknownFile(data, 0)
+    return [(c.length['value'], c.data['value'], c.extra['value'])
+            for c in f.chunks]
+
+def decoded():
+    f = sdec.decode(data, 0, UnknownFile)
+    return [(c.length, c.data, c.extra) for c in f.chunks]
+
+assert(mapped() == decoded())
+for name, func in [('mapped', mapped), ('decoded', decoded)]:
+    elapsed = min(timeit.repeat(func, number=1, repeat=3))
+    print('{:>8}: {:8.2f} ms, {:8.1f} us per chunk'.format(
+        name, elapsed * 1e3, elapsed / COUNT * 1e6
+    ))
@@ -0,0 +1,64 @@
+# benchmarks/memory.py - Memory used per mapped field.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+#
+# Usage: PYTHONPATH=. python benchmarks/memory.py [COUNT]
+
+import sys
+import tracemalloc
+
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+COUNT = int(sys.argv[1]) if 1 < len(sys.argv) else 10000
+
+class Header(sm.Struct):
+    a = sf.IntField(size=sf.IntField.Size.INT32)
+    b = sf.IntField(size=sf.IntField.Size.INT32)
+    c = sf.IntField(size=sf.IntField.Size.INT16)
+    d = sf.ByteArrayField(6)
+
+class SlottedHeader(sm.Struct, slots=True):
+    a = sf.IntField(size=sf.IntField.Size.INT32)
+    b = sf.IntField(size=sf.IntField.Size.INT32)
+    c = sf.IntField(size=sf.IntField.Size.INT16)
+    d = sf.ByteArrayField(6)
+
+def measure(struct):
+    data = sd.Data(bytes(COUNT * 16))
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    data.map_array(0, COUNT, struct)
+    for s in data.mapped.values():
+        for field_name in s['fields']:
+            getattr(s, field_name)['value']
+    used = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    return used / (COUNT * 4)
+
+for struct in [Header, SlottedHeader]:
+    print('{:>14}: {:8.1f} bytes per mapped field'.format(
+        struct.__name__, measure(struct)
+    ))
+
+class Payload(sm.Struct, slots=True):
+    length = sf.IntField(size=sf.IntField.Size.INT16)
+    payload = sf.ByteArrayField(length)
+
+def measure_payloads(zero_copy, size=4096):
+    record = size.to_bytes(2, 'little') + bytes(size)
+    data = sd.Data(record * (COUNT // 10), zero_copy=zero_copy)
+    data.map_array(0, COUNT // 10, Payload)
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    for s in data.mapped.values():
+        s.payload['value'], s.payload['raw']
+    used = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    return used / (COUNT // 10)
+
+for zero_copy in [False, True]:
+    print('{:>14}: {:8.1f} bytes per 4096-byte payload read'.format(
+        'zero-copy' if zero_copy else 'copy', measure_payloads(zero_copy)
+    ))
@@ -0,0 +1,32 @@
+# benchmarks/offset.py - Micro-benchmark of Offset/Size arithmetic.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+#
+# Usage: PYTHONPATH=. python benchmarks/offset.py [COUNT]
+
+import sys
+import timeit
+
+from srddl.core.offset import Offset, Size
+
+COUNT = int(sys.argv[1]) if 1 < len(sys.argv) else 200000
+
+a, b, s = Offset(byte=1, bit=2), Offset(byte=2, bit=3), Size(byte=4)
+d = {Offset(byte=it): it for it in range(64)}
+
+BENCHMARKS = [
+    ('create', lambda: Offset(42)),
+    ('add offset', lambda: a + b),
+    ('add size', lambda: a + s),
+    ('add int', lambda: a + 1),
+    ('sub offset', lambda: b - a),
+    ('compare eq', lambda: a == b),
+    ('compare lt', lambda: a < b),
+    ('compare int', lambda: s < 8),
+    ('hash', lambda: hash(a)),
+    ('dict lookup', lambda: d[s]),
+]
+
+for name, func in BENCHMARKS:
+    elapsed = min(timeit.repeat(func, number=COUNT, repeat=3))
+    print('{:>12}: {:8.1f} ns'.format(name, elapsed / COUNT * 1e9))
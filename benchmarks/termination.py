@@ -0,0 +1,52 @@
+# benchmarks/termination.py - Cost of the end of arrays and of failed lookups.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+#
+# Usage: PYTHONPATH=. python benchmarks/termination.py [COUNT]
+
+import sys
+import timeit
+
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+from srddl.filetypes.elf import ELF
+
+COUNT = int(sys.argv[1]) if 1 < len(sys.argv) else 20000
+
+class Record(sm.Struct):
+    a = sf.IntField(size=sf.IntField.Size.INT32)
+    b = sf.IntField(size=sf.IntField.Size.INT32)
+
+class Chunk(sm.Struct):
+    length = sf.IntField()
+    data = sf.ByteArrayField(length)
+
+RECORDS, CHUNKS = bytes(4 * 8), bytes.fromhex('01610262630166') * 2
+data = sd.Data(bytes(16))
+data.map(0, Record)
+
+def getitem_miss():
+    try:
+        return data.mapped[8]
+    except KeyError:
+        return None
+
+def elf_setup():
+    ELF().setup(sd.FileData(sys.executable))
+
+BENCHMARKS = [
+    ('fill static', lambda: sd.Data(RECORDS).map_fill_array(0, -1, Record), 1),
+    ('fill dynamic', lambda: sd.Data(CHUNKS).map_fill_array(0, -1, Chunk), 1),
+    ('iter fill',
+     lambda: list(sd.Data(RECORDS).iter_fill_array(0, -1, Record)), 1),
+    ('getitem miss', getitem_miss, 1),
+    ('lookup miss', lambda: data.mapped.lookup(8), 1),
+    ('elf setup', elf_setup, 200),
+]
+
+for name, func, div in BENCHMARKS:
+    number = max(1, COUNT // div)
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print('{:>12}: {:8.2f} us'.format(name, elapsed / number * 1e6))
@@ -8,11 +8,11 @@ class Foo(sm.Struct):
     length = sf.IntField()
     data = sf.ArrayField(length, sf.IntField())
 
-f = Foo(buf, 0)
+f = Foo(sd.Data(buf), 0)
 
 assert(f.length == 2)
-assert(f.data == [0x42, 0x43])
+assert(list(f.data) == [0x42, 0x43])
 
 f.length = 4
 
-assert(f.data == [0x42, 0x43, 0x44, 0x45])
+assert(list(f.data) == [0x42, 0x43, 0x44, 0x45])
@@ -0,0 +1,183 @@
+# srddl/cache.py - Persistent cache of the structures mapped on files.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+
+'''
+Caches the structures mapped by the setup of a file type on a file in a
+sidecar file, so that opening the file again restores ``data.mapped`` without
+running the setup:
+
+    data = sd.FileData(filename)
+    scache.setup(Pcap(), data)
+
+The cache stores the class, the offset and the size of every structure
+mapped, with the structures following each other stored as runs of sizes. On
+restore, structures are only mapped when they are first used (see
+:meth:`srddl.data.Data.MappedData.restore`), and their ``_setup`` is not
+called again since the structures it mapped are in the cache too.
+
+A cache is keyed by the path, the size and the modification time of the file,
+and a hash of blocks sampled in the file: a cache that doesn't match the file
+(or the file type) is ignored and replaced. Only classes of modules already
+imported are restored, the cache never imports modules.
+'''
+
+import array
+import hashlib
+import json
+import os
+import struct
+import sys
+
+import srddl.models as sm
+
+from srddl.core.offset import Offset, Size
+
+_HEADER = struct.Struct('<8sII')
+_MAGIC, _VERSION = b'SRDDLMAP', 1
+
+# Blocks of the file hashed to detect changes that keep the size and the
+# modification time.
+SAMPLE_COUNT, SAMPLE_SIZE = 16, 4096
+
+
+def cache_path(filename):
+    '''Returns the path of the sidecar cache of ``filename``.'''
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    return os.path.join(dirname, '.{}.srddl-cache'.format(basename))
+
+
+def identity(data):
+    '''Returns the identity of the file of ``data``, as a dict.'''
+    st, size = os.stat(data.filename), len(data.buf)
+    sha1 = hashlib.sha1(str(size).encode())
+    step = max(size // SAMPLE_COUNT, SAMPLE_SIZE)
+    for offset in range(0, size, step):
+        sha1.update(data.buf[offset:offset + SAMPLE_SIZE])
+    sha1.update(data.buf[max(size - SAMPLE_SIZE, 0):size])
+    return {
+        'path': os.path.abspath(data.filename),
+        'size': size,
+        'mtime_ns': st.st_mtime_ns,
+        'hash': sha1.hexdigest(),
+    }
+
+
+def setup(filetype, data, path=None):
+    '''
+    Sets up ``data`` (a :class:`srddl.data.FileData`) with ``filetype``:
+    mapped structures are restored from the cache at ``path`` (by default
+    :func:`cache_path`) when it matches the file, else the setup of the file
+    type is run and the cache is saved. Returns True if the cache was used.
+    '''
+    path = cache_path(data.filename) if path is None else path
+    if load(filetype, data, path):
+        return True
+    filetype.setup(data)
+    try:
+        save(filetype, data, path)
+    except OSError:
+        # The cache is optional, the directory may be read-only.
+        pass
+    return False
+
+
+def save(filetype, data, path):
+    '''Saves the structures mapped on ``data`` in the cache at ``path``.'''
+    classes, runs, sizes = dict(), [], []
+    for klass, offset, size in data.mapped.entries():
+        idx = classes.setdefault(_name(klass), len(classes))
+        last = runs[-1] if runs else None
+        if last is not None and last[0] == idx and last[3] == offset._bits:
+            last[2] += 1
+            last[3] += size._bits
+        else:
+            runs.append([idx, offset._bits, 1, offset._bits + size._bits])
+        sizes.append(size._bits)
+    header = identity(data)
+    header['filetype'] = _name(type(filetype))
+    header['classes'] = list(classes)
+    header['runs'] = [run[:3] for run in runs]
+    header = json.dumps(header).encode()
+    sizes = array.array('Q', sizes)
+    if sys.byteorder != 'little':
+        sizes.byteswap()
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(header)))
+        f.write(header)
+        f.write(sizes.tobytes())
+    os.replace(tmp, path)
+
+
+def load(filetype, data, path):
+    '''
+    Restores the structures of the cache at ``path`` in ``data``, and returns
+    True, if the cache matches the file and the file type. Returns False
+    otherwise.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return False
+    try:
+        entries = _entries(filetype, data, raw)
+    except (AttributeError, IndexError, TypeError, ValueError):
+        # Corrupted cache.
+        entries = None
+    if entries is None:
+        return False
+    data.mapped.restore(data, entries)
+    return True
+
+
+def _entries(filetype, data, raw):
+    if len(raw) < _HEADER.size:
+        return None
+    magic, version, length = _HEADER.unpack_from(raw)
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    try:
+        header = json.loads(raw[_HEADER.size:_HEADER.size + length].decode())
+    except ValueError:
+        return None
+    if header.get('filetype') != _name(type(filetype)):
+        return None
+    if any(header.get(k) != v for k, v in identity(data).items()):
+        return None
+    classes = [_find_class(name) for name in header.get('classes', [])]
+    if None in classes:
+        return None
+    sizes = array.array('Q')
+    raw = raw[_HEADER.size + length:]
+    if len(raw) % sizes.itemsize:
+        return None
+    sizes.frombytes(raw)
+    if sys.byteorder != 'little':
+        sizes.byteswap()
+    entries, idx = [], 0
+    for class_idx, start, count in header.get('runs', []):
+        klass, bits = classes[class_idx], start
+        for size in sizes[idx:idx + count]:
+            entries.append((klass, Offset._from_bits(bits),
+                            Size._from_bits(size)))
+            bits += size
+        idx += count
+    if idx != len(sizes):
+        return None
+    return entries
+
+
+def _name(klass):
+    return '{}:{}'.format(klass.__module__, klass.__qualname__)
+
+
+def _find_class(name):
+    module_name, _, qualname = name.partition(':')
+    res = sys.modules.get(module_name)
+    for attr in qualname.split('.'):
+        res = getattr(res, attr, None)
+    if isinstance(res, type) and issubclass(res, sm.Struct):
+        return res
+    return None
@@ -0,0 +1,147 @@
+# srddl/columns.py - Columnar export of structures.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+
+'''
+Exports the values of many structures of the same class as columns, one per
+field of the structure (fields of sub-structures are named by their path, like
+``pkthdr.caplen``). Integers are exported as contiguous arrays: NumPy arrays
+when NumPy is available, :class:`array.array` otherwise. Byte arrays are
+exported as lists of bytes, and other fields (arrays, switches, paddings) are
+not exported.
+
+Integers are the raw values of the fields (like ``field['value']``, with
+:class:`srddl.fields.Value` objects replaced by their value). Fields with a
+static format that are at the same offset in every structure (the fields
+before the first field with a variable size) are unpacked directly from the
+data, without mapping the structures. Other fields are read from their bound
+values.
+'''
+
+import array
+import collections
+import itertools
+import struct
+
+import srddl.core.helpers as sch
+import srddl.fields as sf
+import srddl.models as sm
+
+_Leaf = collections.namedtuple('_Leaf', [
+    'name', 'path', 'field', 'offset', 'frmt',
+])
+
+
+def columns(data, klass, structs, offsets=None):
+    '''
+    Returns an ordered dict of the columns of the structures of class ``klass``
+    in ``data``. ``structs`` is a sequence of structures, or of the offsets of
+    the structures (they are then only mapped if some fields need it).
+    ``offsets`` may give the offsets of the structures in bytes.
+    '''
+    leaves = list(_leaves(klass))
+    if offsets is None:
+        offsets = [_offset(it) for it in structs]
+    res, mapped = collections.OrderedDict(), None
+    static = [leaf for leaf in leaves if leaf.offset is not None]
+    static_columns = _static_columns(data, static, offsets)
+    for leaf in leaves:
+        if leaf.offset is not None:
+            res[leaf.name] = static_columns[leaf.name]
+            continue
+        if mapped is None:
+            mapped = [it if isinstance(it, sm.Struct) else klass(data, it)
+                      for it in structs]
+        values = []
+        for it in mapped:
+            for field_name in leaf.path:
+                it = getattr(it, field_name)
+            if isinstance(leaf.field, sf.IntField):
+                # Bit masks decode to lists, so the raw integer is unpacked.
+                sig = leaf.field._sig(it['size'])
+                values.append(data.unpack_from(sig, it['offset'].byte)[0])
+            else:
+                values.append(it['value'])
+        res[leaf.name] = _column(leaf.field, values)
+    return res
+
+
+def _offset(struct):
+    if isinstance(struct, sm.Struct):
+        return struct['offset'].byte
+    return int(struct)
+
+
+def _leaves(klass, path=(), offset=0):
+    # Relative offsets are only known for the fields before the first field
+    # with a variable size, and when fields are not reordered.
+    if klass._pre_mapping is not sm.Struct._pre_mapping:
+        offset = None
+    for field_name in klass._srddl_order:
+        field = klass._srddl_fields[klass._srddl_names[field_name]]
+        frmt = field.static_format()
+        if isinstance(field, sf.SuperField):
+            yield from _leaves(field._cls, path + (field_name,), offset)
+        elif isinstance(field, (sf.IntField, sf.BitField, sf.ByteArrayField)):
+            leaf_offset = offset if frmt is not None else None
+            name = '.'.join(path + (field_name,))
+            yield _Leaf(name, path + (field_name,), field, leaf_offset, frmt)
+        if offset is not None:
+            offset = None if frmt is None else offset + sch.format_size(frmt)
+
+
+def _static_columns(data, leaves, offsets):
+    res = dict()
+    buf = data.buffer() if sch.NUMPY_ON else None
+    if buf is not None:
+        try:
+            buf = sch.numpy.frombuffer(buf, dtype=sch.numpy.uint8)
+        except (AttributeError, TypeError, ValueError):
+            buf = None
+        if buf is not None:
+            offsets_array = sch.numpy.array(offsets, dtype=sch.numpy.int64)
+            for leaf in leaves:
+                dtype = sch.format_dtype(leaf.frmt)
+                if dtype is None or dtype[0] == 'S':
+                    continue
+                # Gather the bytes of the field in every structure at once.
+                idx = offsets_array[:, None] + leaf.offset
+                idx = idx + sch.numpy.arange(sch.format_size(leaf.frmt))
+                res[leaf.name] = buf[idx].view(dtype).ravel()
+    leaves = [leaf for leaf in leaves if leaf.name not in res]
+    if not leaves:
+        return res
+
+    # Other fields are unpacked with one format per structure when they share
+    # their byte order, and one format per field otherwise.
+    groups = [[None, []]]
+    for leaf in sorted(leaves, key=lambda leaf: leaf.offset):
+        e = leaf.frmt[0] if leaf.frmt[:1] in ['<', '>', '!'] else None
+        if e is not None and sch.format_size(leaf.frmt[1:]) != 1:
+            if groups[-1][0] not in [None, e]:
+                groups.append([None, []])
+            groups[-1][0] = e
+        groups[-1][1].append(leaf)
+    for endianess, group in groups:
+        frmt, cur = '', group[0].offset
+        for leaf in group:
+            frmt += '{}x{}'.format(leaf.offset - cur, leaf.frmt.lstrip('<>!'))
+            cur = leaf.offset + sch.format_size(leaf.frmt)
+        compiled = struct.Struct((endianess or '<') + frmt)
+        start = group[0].offset
+        unpack = data.unpack_from
+        values = list(itertools.chain.from_iterable(
+            unpack(compiled, offset + start) for offset in offsets
+        ))
+        for idx, leaf in enumerate(group):
+            res[leaf.name] = _column(leaf.field, values[idx::len(group)])
+    return res
+
+
+def _column(field, values):
+    if isinstance(field, sf.ByteArrayField):
+        return list(values)
+    signed = getattr(field, '_signed', False)
+    if sch.NUMPY_ON:
+        return sch.numpy.array(values, dtype='i8' if signed else 'u8')
+    return array.array('q' if signed else 'Q', values)
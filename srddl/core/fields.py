@@ -15,71 +15,15 @@ import srddl.helpers as sh
 from srddl.core.signals import Signal
 from srddl.core.offset import Offset, Size
 
-FieldInitStatus = sch.enum(KO=0, INIT=1, OK=2)
+
+# The state kept by structures for each of their fields. A None state means the
+# field was not initialized or its value was not decoded yet.
+FieldState = sch.enum(BOUNDVALUE=0, VALUE=1)
 
 class _MetaAbstractMappedValue(scnd._MetaNamedDict, sch.MetaAbstractDescriptor):
     pass
 
-class _MetaAbstractField(_MetaAbstractMappedValue):
-    '''
-    This meta-class will make sure that initialization of a Field is done
-    correctly. To do so, it will wrap some methods of a class with its own
-    functions and do some checks for the field.
-    '''
-
-    def __new__(cls, clsname, bases, kwds):
-        # When referencing a field from another, we basically need to know if
-        # the field is initialized or not, so if we can fetch its value or not.
-        initialize = kwds.get('initialize')
-        if initialize is not None:
-            @functools.wraps(initialize)
-            def wrapper(self, instance, offset, **kwargs):
-                # There are three states to the initialization process:
-                #
-                #   FieldInitStatus.KO, FieldInitStatus.INIT, FieldInitStatus.OK
-                #
-                # When the value is not present, this means we haven't even
-                # begun to initialize the field. When False, the initialization
-                # process has begun, and finally when True everything is fine.
-                #
-                # Since we want inheritance to work, we need to set the status
-                # only on the call on a instance that is the first one.
-                try:
-                    status = self._get_data(instance, 'status')
-                except se.NoFieldDataError:
-                    status = FieldInitStatus.KO
-                self._set_data(instance, 'status', FieldInitStatus.INIT)
-
-                if status != FieldInitStatus.INIT:
-                    self._set_data(instance, 'status', FieldInitStatus.OK)
-            kwds['initialize'] = wrapper
-
-        __get__ = kwds.get('__get__')
-        if __get__ is not None:
-            @functools.wraps(__get__)
-            @functools.lru_cache()
-            def wrapper(self, instance, owner=None):
-                if self._get_data(instance, 'status') != FieldInitStatus.OK:
-                    raise se.FieldNotReadyError(self)
-                res = __get__(self, instance, owner=owner)
-                from srddl.models import Struct
-                if not (res is None or isinstance(res, (BoundValue, Struct))):
-                    raise se.NotABoundValueError(self)
-                return res
-            kwds['__get__'] = wrapper
-
-        for func_name in ['decode']:
-            func = kwds.get(func_name)
-            if func is not None:
-                @functools.wraps(func)
-                @functools.lru_cache()
-                def wrapper(*args, **kwargs):
-                    return func(*args, **kwargs)
-                kwds[func_name] = wrapper
-        return super().__new__(cls, clsname, bases, kwds)
-
-
-class Value(scnd.NamedDict):
+class Value(scnd.NamedDict, slots=True):
     '''
     The Value class is used by the ``values`` keyword parameter of certain
     fields. It is used to define documentation on possibe values. The usage of
@@ -136,6 +80,10 @@ class AbstractMappedValue(Value, metaclass=_MetaAbstractMappedValue):
         init_props = ['offset'] + Value.Meta.init_props
 
     def _extract_raw(self, data):
+        offset, size = self['offset'], self['size']
+        if data.zero_copy and offset.aligned() and size.aligned():
+            # Aligned values need no masking, so they are views of the data.
+            return data.slice_from(offset.byte, size.byte)
         # Unpack the complete data.
         f = '{}s'.format(self['size'].rounded())
         d = bytearray(data.unpack_from(f, self['offset'].rounded())[0])
@@ -197,6 +145,8 @@ class BoundValue(AbstractMappedValue):
     anyway.
     '''
 
+    __slots__ = ('_instance', '_valid_func')
+
     class Meta(AbstractMappedValue.Meta):
         init_props = ['_', 'field'] + AbstractMappedValue.Meta.init_props
 
@@ -220,7 +170,7 @@ class BoundValue(AbstractMappedValue):
         return Size(byte=sch.reference_value(self._instance, self._field._size))
 
     def _value(self, flags):
-        res = self._field.decode(self._instance, self['offset'])
+        res = self._field.decoded(self._instance, self['offset'])
         if isinstance(res, Value):
             self.copy(res)
             return res['value']
@@ -263,7 +213,17 @@ class BoundValue(AbstractMappedValue):
         return self.value < other
 
     def set(self, value):
+        srddl = self._instance._srddl
+        # Sizes of the structures are computed from the data, so they are
+        # fetched before the write to know if it resized them.
+        sizes = srddl.sizes()
         self._field.encode(self._instance, self['offset'], value)
+        self._field.invalidate(self._instance)
+        srddl.changed(self._field, sizes=sizes)
+
+    def invalidate(self):
+        '''Forgets the properties copied from the Value the field matched.'''
+        self._nd_overrides = None
 
 
 class AbstractField(scnd.NamedDict):
@@ -288,7 +248,7 @@ class AbstractField(scnd.NamedDict):
         bv = self.metaconf('boundvalue_class')(*args)
         if path is not None:
             self._path = path
-        self._set_data(instance, 'boundvalue', bv)
+        instance._srddl.set_state(self, FieldState.BOUNDVALUE, bv)
         return bv['size']
 
     @scnd.property()
@@ -299,15 +259,102 @@ class AbstractField(scnd.NamedDict):
     def _path(self, flags):
         pass
 
-    @functools.lru_cache()
     def __get__(self, instance, owner=None):
-        return self._get_data(instance, 'boundvalue')
+        srddl = instance._srddl
+        res = srddl.get_state(self, FieldState.BOUNDVALUE)
+        if res is None and srddl.map_field(self):
+            res = srddl.get_state(self, FieldState.BOUNDVALUE)
+        if res is None:
+            raise se.NoFieldDataError(instance, self, 'boundvalue')
+        return res
 
     def __set__(self, instance, value):
         '''This function must set the new value of the field.'''
-        bv = self.__get__(instance)
-        offset = instance['offset'] + bv['offset']
-        self.encode(instance, offset, value)
+        self.__get__(instance).set(value)
+
+    def decoded(self, instance, offset):
+        '''
+        Returns the value of the field, decoded only once per structure. The
+        value is cached in the state of the structure, so it is released with
+        the structure. :meth:`invalidate` must be called when the data under
+        the field is written.
+        '''
+        res = instance._srddl.get_state(self, FieldState.VALUE)
+        if res is None:
+            res = self.decode(instance, offset)
+            instance._srddl.set_state(self, FieldState.VALUE, res)
+        return res
+
+    def invalidate(self, instance):
+        '''Drops the value of the field cached for the structure.'''
+        instance._srddl.set_state(self, FieldState.VALUE, None)
+        bv = instance._srddl.get_state(self, FieldState.BOUNDVALUE)
+        if bv is not None:
+            bv.invalidate()
+
+    def initialize_unpacked(self, instance, offset, value, path=None):
+        '''
+        Initializes the field when its value was already unpacked by the
+        compiled layout of the structure (see :meth:`static_format`). ``value``
+        is the value unpacked for the field, or None if the format of the field
+        only skips its bytes.
+        '''
+        args = [instance, self, offset, self._valid]
+        bv = self.metaconf('boundvalue_class')(*args)
+        if path is not None:
+            self._path = path
+        srddl = instance._srddl
+        srddl.set_state(self, FieldState.BOUNDVALUE, bv)
+        if value is not None:
+            value = self.from_unpacked(instance, value)
+            srddl.set_state(self, FieldState.VALUE, value)
+
+    def static_format(self):
+        '''
+        Returns the :mod:`struct` format describing the field when its layout
+        never depends on the data (no reference to another field or to the
+        data), or None. The format may start with a byte order character. When
+        all the fields of a structure return a format, the structure is
+        compiled into a single :class:`struct.Struct`.
+        '''
+        return None
+
+    def references(self):
+        '''
+        Returns the references (see :func:`srddl.core.helpers.reference_value`)
+        the layout or the value of the field depend on. When the data of a
+        referenced field is written, the field is mapped again (see
+        :meth:`srddl.models._SrddlInternal.changed`).
+        '''
+        return [getattr(self, '_size', None)]
+
+    def static_size(self):
+        '''
+        Returns the size of the field when it never depends on the data, or
+        None. By default, it is the size of the static format of the field.
+        '''
+        frmt = self.static_format()
+        return None if frmt is None else Size(sch.format_size(frmt))
+
+    def from_unpacked(self, instance, value):
+        '''
+        Converts the value unpacked with the static format of the field into
+        the value returned by :meth:`decode`.
+        '''
+        return value
+
+    def generate_decoder(self, gen, target):
+        '''
+        Generates the code of a decoder (see :mod:`srddl.decoders`) assigning
+        the value of the field to ``target``, with the generator ``gen``.
+        Returns False if the field can't be decoded by generated code. By
+        default, fields with a static format are supported.
+        '''
+        frmt = self.static_format()
+        if frmt is None:
+            return False
+        gen.unpack(target, frmt)
+        return True
 
     @abc.abstractmethod
     def decode(self, instance, offset):
@@ -317,18 +364,21 @@ class AbstractField(scnd.NamedDict):
     def encode(self, instance, offset, value):
         pass
 
-    def _data_key(self, name):
-        return 'data-{:x}_{}'.format(id(self), name)
-
-    def _get_data(self, instance, name):
-        key = self._data_key(name)
-        if key not in instance._srddl.fields_data:
+    def _get_data(self, instance, name, *default):
+        '''
+        Returns the data named ``name`` associated with the field, or
+        ``default`` if given and the field has no such data.
+        '''
+        fields_data = instance._srddl.fields_data
+        if fields_data is None or (self, name) not in fields_data:
+            if default:
+                return default[0]
             raise se.NoFieldDataError(instance, self, name)
-        return instance._srddl.fields_data[key]
+        return fields_data[(self, name)]
 
     def _set_data(self, instance, name, value):
         '''Sets the data associated with the field.'''
-        instance._srddl.fields_data[self._data_key(name)] = value
+        instance._srddl.set_data(self, name, value)
 
     def _display_value(self, flags, val):
         return None
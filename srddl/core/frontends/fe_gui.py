@@ -10,6 +10,7 @@ try:
 except ImportError:
     GUI_ON = False
 
+import srddl.cache as scache
 import srddl.core.fields as scf
 import srddl.core.frontend_loader as scfe
 import srddl.core.frontends.fe_common as scfc
@@ -23,9 +24,13 @@ class GUI(scfe.Frontend):
         help = 'graphical interface!'
         enabled = GUI_ON
 
+    def init(self):
+        self.parser.add_argument('--cache', action='store_true', default=False,
+                                 help='cache the structures mapped on files.')
+
     def process(self, args):
         app = QtGui.QApplication(sys.argv)
-        window = MainWindow()
+        window = MainWindow(cache=args.cache)
         window.show()
         sys.exit(app.exec_())
 
@@ -278,9 +283,9 @@ if GUI_ON:
                 )
                 super().__init__(value, [res], parent=parent)
 
-        def __init__(self, hexview, parent=None):
+        def __init__(self, hexview, cache=False, parent=None):
             super().__init__(parent=parent)
-            self.hexview = hexview
+            self.hexview, self.cache = hexview, cache
 
             self.itemExpanded.connect(self._itemExpand_handler)
             self.itemCollapsed.connect(functools.partial(
@@ -295,7 +300,11 @@ if GUI_ON:
                 self.setVisible(False)
                 return
 
-            ft.setup(data)
+            if self.cache and isinstance(data, sd.FileData):
+                # Structures are restored from the cache of the file if valid.
+                scache.setup(ft, data)
+            else:
+                ft.setup(data)
             TREE = [
                 (list, 'list'),
                 (tuple, 'tuple'),
@@ -428,7 +437,7 @@ if GUI_ON:
 
 
     class MainWindow(QtGui.QMainWindow):
-        def __init__(self):
+        def __init__(self, cache=False):
             super().__init__()
 
             # General attributes.
@@ -441,7 +450,7 @@ if GUI_ON:
             layout = QtGui.QHBoxLayout()
 
             self.hexview = HexView()
-            self.structtree = StructureTreeWidget(self.hexview)
+            self.structtree = StructureTreeWidget(self.hexview, cache=cache)
 
             layout.addWidget(self.hexview)
             layout.addWidget(self.structtree)
@@ -491,12 +500,17 @@ if GUI_ON:
             filename = QtGui.QFileDialog.getOpenFileName(self, **kwds)[0]
             if filename == '':
                 return
-            self.data = sd.FileData(filename)
+            with open(filename, 'rb') as f:
+                compressed = sd.CompressedData.detect(f.read(6)) is not None
+            if compressed:
+                self.data = sd.CompressedData(filename)
+            else:
+                self.data = sd.FileData(filename)
 
             options = FileOpenerOptions(self.fts.filter(self.data))
             options.exec_()
 
-            if not options.chosen_ro():
+            if not compressed and not options.chosen_ro():
                 self.data = sd.FileData(filename, mode=sd.FileData.Mode.RDWR)
             ft = options.chosen_ft()
 
@@ -19,9 +19,12 @@ class FileTypesLoader:
 
     def filter(self, data):
         possibilities = set()
+        # Compressed files are recognized by the extension before the one of
+        # the compression.
+        filename = getattr(data, 'inner_filename', data.filename) or ''
         for ft in self.fts.values():
             for ext in ft['extensions']:
-                if data.filename.endswith('.{}'.format(ext)):
+                if filename.endswith('.{}'.format(ext)):
                     possibilities.add((ft, 'Extension {} recognized.'.format(ext)))
             else:
                 if ft.check(data):
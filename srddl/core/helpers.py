@@ -6,10 +6,17 @@ import functools
 import imp
 import inspect
 import os
+import struct
 import sys
 
 import srddl.core.exceptions as sce
 
+NUMPY_ON = True
+try:
+    import numpy
+except ImportError:
+    NUMPY_ON = False
+
 class MetaAbstractDescriptor(abc.ABCMeta):
     '''
     This metaclass inherits from abc.ABCMeta and wrap __get__ and __set__
@@ -52,6 +59,44 @@ def enum(**enums):
     return type('Enum', (), namespace)
 
 
+def format_size(frmt):
+    '''
+    Returns the size of a :mod:`struct` format, using standard sizes and no
+    alignment when the format doesn't start with a byte order character.
+    '''
+    if frmt[:1] not in ['<', '>', '!', '=', '@']:
+        frmt = '<' + frmt
+    return struct.calcsize(frmt)
+
+
+def format_count(frmt):
+    '''Returns the number of values unpacked with a :mod:`struct` format.'''
+    size = format_size(frmt)
+    if frmt[:1] not in ['<', '>', '!', '=', '@']:
+        frmt = '<' + frmt
+    return len(struct.unpack(frmt, bytes(size)))
+
+
+_DTYPES = {'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4',
+           'q': 'i8', 'Q': 'u8'}
+
+def format_dtype(frmt, endianess='<'):
+    '''
+    Returns the NumPy type equivalent to a :mod:`struct` format of one integer
+    or string, or None. ``endianess`` is used when the format doesn't start
+    with a byte order character.
+    '''
+    if frmt[:1] in ['<', '>', '!']:
+        endianess, frmt = frmt[0], frmt[1:]
+    endianess = endianess.replace('!', '>')
+    count, code = frmt[:-1], frmt[-1:]
+    if code in _DTYPES and not count:
+        return endianess + _DTYPES[code]
+    if code == 's':
+        return 'S' + (count or '1')
+    return None
+
+
 def reference_value(instance, ref, type_=int):
     from srddl.core.fields import AbstractField, BoundValue
     '''
@@ -87,6 +132,8 @@ def reference_value(instance, ref, type_=int):
 
 
 class MetaConf:
+    __slots__ = ()
+
     class MetaBase:
         pass
 
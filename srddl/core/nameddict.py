@@ -1,6 +1,9 @@
 # Author: Franck Michea <franck.michea@gmail.com>
 # License: New BSD License (See LICENSE)
 
+import itertools
+import types
+
 import srddl.core.exceptions as sce
 import srddl.core.helpers as sch
 
@@ -8,10 +11,37 @@ def _nameddict_propname(funcname):
     return funcname[1:]  # XXX: Assumes that the func is private (starts with _).
 
 class _MetaNamedDict(type):
-    def __new__(cls, clsname, bases, namespace, **kwds):
+    '''
+    Keeps track of the properties of named dicts and checks their
+    redefinitions.
+
+    A named dict class can also be created with the ``slots=True`` keyword, and
+    this mode is then inherited by its sub-classes. Slotted classes get an
+    automatic ``__slots__`` attribute, completed with one slot per abstract
+    property that is set by the constructor (see ``init_props``). Other
+    properties overridden on an instance are kept in a small dict, only
+    created when needed. Attributes not related to properties must be listed
+    in the ``__slots__`` of the class.
+
+    Each class also gets a dispatch table (``__nd_table__``) from the keys
+    accepted by ``__getitem__`` to the property they access and the flags it
+    is called with. It is filled with every property and combination of its
+    flags (in their declared order) when the class is created, and completed
+    with the other spellings of keys when they are first used.
+    '''
+
+    def __new__(cls, clsname, bases, namespace, slots=None, **kwds):
+        if slots is None:
+            slots = any(getattr(base, '__nd_slotted__', False)
+                        for base in bases)
+        slotted_aprops = set()
+        if slots:
+            slotted_aprops = cls._nd_slots(bases, namespace)
+
         res = super().__new__(cls, clsname, bases, namespace, **kwds)
+        res.__nd_slotted__ = slots
 
-        props, aprops = set(), set()
+        props, aprops = set(), set(slotted_aprops)
         for base in bases:
             try:
                 props.update(base.__nd_props__)
@@ -20,6 +50,8 @@ class _MetaNamedDict(type):
                 pass
         for kwd_name, kwd_val in res.__dict__.items():
             propname = _nameddict_propname(kwd_name)
+            if propname in slotted_aprops:
+                continue
             if propname in (aprops | props):
                 reason = None
                 try:
@@ -32,7 +64,11 @@ class _MetaNamedDict(type):
                 except AttributeError:
                     try:
                         attr = getattr(super(res, res), kwd_name)
-                        _nameddict_property.copy(kwd_val, attr)
+                        if isinstance(attr, types.MemberDescriptorType):
+                            # Abstract property replaced by a slot.
+                            property()(kwd_val)
+                        else:
+                            _nameddict_property.copy(kwd_val, attr)
                     except AttributeError:
                         reason = 'can\'t transform the overriding function '
                         reason += 'into a named dict property.'
@@ -50,6 +86,62 @@ class _MetaNamedDict(type):
                 pass
         res.__nd_props__ = props
         res.__nd_abstractprops__ = aprops
+
+        res.__nd_table__ = dict()
+        for name in res._nd_names():
+            prop = getattr(res, '_{}'.format(name))
+            flags = getattr(prop, '__nd_propflags__', [])
+            for count in range(len(flags) + 1):
+                for comb in itertools.combinations(flags, count):
+                    key = name
+                    if comb:
+                        key += _NAMEDDICT_SEP + _NAMEDDICT_FSEP.join(comb)
+                    res._nd_entry(key)
+        return res
+
+    @staticmethod
+    def _nd_slots(bases, namespace):
+        '''
+        Generates the ``__slots__`` of a slotted class in its namespace, and
+        returns the abstract properties that were replaced by a slot.
+        '''
+        meta, init_props = namespace.get('Meta'), None
+        if meta is not None:
+            init_props = getattr(meta, 'init_props', None)
+        for base in bases:
+            if init_props is not None:
+                break
+            try:
+                init_props = base.metaconf('init_props')
+            except (AttributeError, sce.NoMetaConfError):
+                pass
+        slotnames = set()
+        for base in bases:
+            for klass in base.__mro__:
+                slotnames.update(vars(klass).get('__slots__', []))
+        aprops, concrete = set(), set()
+        for base in bases:
+            aprops.update(getattr(base, '__nd_abstractprops__', []))
+            concrete.update(getattr(base, '__nd_props__', []))
+        for kwd_name, kwd_val in namespace.items():
+            if getattr(kwd_val, '__nd_propabstract__', False):
+                aprops.add(kwd_val.__nd_propname__)
+            elif kwd_name.startswith('_'):
+                concrete.add(_nameddict_propname(kwd_name))
+
+        slots, res = list(namespace.get('__slots__', [])), set()
+        if '_nd_overrides' not in slotnames:
+            slots.append('_nd_overrides')
+        for name in (init_props or []):
+            attr = '_{}'.format(name)
+            if name not in aprops or name in concrete or attr in slotnames:
+                continue
+            # The placeholder of the abstract property is replaced by the slot.
+            if attr in namespace:
+                del namespace[attr]
+            slots.append(attr)
+            res.add(name)
+        namespace['__slots__'] = tuple(slots)
         return res
 
     def __call__(self, *args, **kwargs):
@@ -110,6 +202,11 @@ _NAMEDDICT_SEP = ':'
 _NAMEDDICT_FSEP = ','
 
 class NamedDict(sch.MetaConf, metaclass=_MetaNamedDict):
+    __slots__ = ()
+
+    # Properties overridden on the instances of slotted classes.
+    _nd_overrides = None
+
     class MetaBase:
         init_props = []
 
@@ -119,6 +216,8 @@ class NamedDict(sch.MetaConf, metaclass=_MetaNamedDict):
         arguments are are in the order of the ``fields`` list. Then you can
         override specific values with keyword arguments.
         '''
+        if self.__nd_slotted__:
+            self._nd_overrides = None
         vals = dict(zip([c for c in self.metaconf('init_props') if c != '_'], args))
         vals.update(kwargs)
         for name in self.metaconf('init_props'):
@@ -130,21 +229,57 @@ class NamedDict(sch.MetaConf, metaclass=_MetaNamedDict):
 #                if prop.__nd_propabstract__:
 #                    raise AttributeError('OK')
 #            except AttributeError:
-            setattr(self, '_{}'.format(name), vals.get(name, None))
+            self._nd_set(name, vals.get(name, None))
 
     def __getitem__(self, _attr_name):
         '''This function permits to access the attributes of the object.'''
-        try:
-            attr_name, attr_flags = _attr_name.split(_NAMEDDICT_SEP, 1)
-        except ValueError:
-            attr_name, attr_flags = _attr_name, ''
-        init_props = set(self.__class__.__nd_abstractprops__)
-        init_props &= set(self.metaconf('init_props'))
-        init_props |= self.__class__.__nd_props__
-        if attr_name not in init_props:
-            raise KeyError
-        prop = getattr(self, '_{}'.format(attr_name))
+        entry = self.__nd_table__.get(_attr_name)
+        if entry is None:
+            entry = self._nd_entry(_attr_name)
+        attr_name, attr, func, kwds = entry
+        if self._nd_overrides is not None and attr_name in self._nd_overrides:
+            prop = self._nd_overrides[attr_name]
+        else:
+            prop = getattr(self, attr)
+        if func is None:
+            return prop
+        if kwds is not None and getattr(prop, '__func__', None) is func:
+            return func(self, kwds)
+        return self._nd_call(prop, _attr_name)
+
+    @classmethod
+    def _nd_names(cls):
+        '''Returns the names of the properties read by ``__getitem__``.'''
+        names = set(cls.__nd_abstractprops__) & set(cls.metaconf('init_props'))
+        return names | cls.__nd_props__
 
+    @classmethod
+    def _nd_entry(cls, _attr_name):
+        '''
+        Computes the entry of the dispatch table of the class for a key: the
+        name of the property, its attribute, the function of the class (None
+        if the property is a plain attribute) and the flags to call it with
+        (None if the function doesn't accept them).
+        '''
+        attr_name, _, attr_flags = _attr_name.partition(_NAMEDDICT_SEP)
+        if attr_name not in cls._nd_names():
+            raise KeyError(_attr_name)
+        attr = '_{}'.format(attr_name)
+        func, kwds = getattr(cls, attr, None), None
+        attr_flags = set(f.strip() for f in attr_flags.split(_NAMEDDICT_FSEP))
+        attr_flags.discard('')
+        prop_flags = getattr(func, '__nd_propflags__', None)
+        if prop_flags is None:
+            func = None
+        elif not attr_flags - set(prop_flags):
+            kwds = dict([(c, c in attr_flags) for c in prop_flags])
+            kwds['_nd_attrname'] = _attr_name
+        cls.__nd_table__[_attr_name] = entry = (attr_name, attr, func, kwds)
+        return entry
+
+    def _nd_call(self, prop, _attr_name):
+        '''Returns the value of a property that isn't in the dispatch table.'''
+        attr_name, _, attr_flags = _attr_name.partition(_NAMEDDICT_SEP)
         attr_flags = [f.strip() for f in attr_flags.split(_NAMEDDICT_FSEP)]
         while True:
             try: attr_flags.remove('')
@@ -163,4 +298,16 @@ class NamedDict(sch.MetaConf, metaclass=_MetaNamedDict):
 
     def copy(self, other):
         for field in type(other).__nd_props__:
-            setattr(self, '_{}'.format(field), other[field])
+            self._nd_set(field, other[field])
+
+    def _nd_set(self, name, value):
+        '''Overrides the property ``name`` on this instance.'''
+        try:
+            setattr(self, '_{}'.format(name), value)
+        except AttributeError:
+            if not self.__nd_slotted__:
+                raise
+            if self._nd_overrides is None:
+                self._nd_overrides = dict()
+            self._nd_overrides[name] = value
+
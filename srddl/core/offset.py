@@ -2,24 +2,45 @@
 # Author: Franck Michea <franck.michea@gmail.com>
 # License: New BSD License (See LICENSE)
 
-import functools
 import abc
+import operator
 
 
-@functools.total_ordering
 class _Offset(metaclass=abc.ABCMeta):
+    '''
+    Offsets and sizes are immutable and stored as a single number of bits, so
+    arithmetic and comparisons are done on one integer. Byte-aligned values
+    constructed from an integer take a fast path, and the results of
+    operations are created without calling the constructor again.
+    '''
+
+    __slots__ = ('_bits',)
+
     def __init__(self, byte=0, bit=0):
-        from srddl.core.fields import BoundValue
-        if isinstance(byte, BoundValue):
-            self.byte, self.bit = byte['value'], bit
+        if byte.__class__ is int:
+            self._bits = (byte << 3) + bit
         elif isinstance(byte, _Offset):
-            self.byte, self.bit = byte.byte, byte.bit
+            self._bits = byte._bits + bit
         else:
-            self.byte, self.bit = byte, bit
-        self.byte, self.bit = self.byte + self.bit // 8, self.bit % 8
+            # Bound values of integers, and any other integer-like objects.
+            self._bits = (operator.index(byte) << 3) + bit
+
+    @classmethod
+    def _from_bits(cls, bits):
+        res = cls.__new__(cls)
+        res._bits = bits
+        return res
+
+    @property
+    def byte(self):
+        return self._bits >> 3
+
+    @property
+    def bit(self):
+        return self._bits & 0b111
 
     def __index__(self):
-        return self.byte
+        return self._bits >> 3
 
     def __repr__(self):
         return '<{} at {:#x} with value ({}, {})>'.format(
@@ -37,46 +58,60 @@ class _Offset(metaclass=abc.ABCMeta):
         return res
 
     def __hash__(self):
-        return hash('{}::{}'.format(self.byte, self.bit))
+        # Byte-aligned offsets hash like the integer they are equal to.
+        return hash(self._bits >> 3)
 
-    def __eq__(self, other):
-        # This function is needed by functools.total_ordering.
+    def _other_bits(self, other):
         if isinstance(other, _Offset):
-            return (self.byte, self.bit) == (other.byte, other.bit)
-        return (self.byte, self.bit) == (other, 0)
+            return other._bits
+        if isinstance(other, int):
+            return other << 3
+        if isinstance(other, float):
+            return other * 8
+        return None
+
+    def __eq__(self, other):
+        bits = self._other_bits(other)
+        return NotImplemented if bits is None else self._bits == bits
+
+    def __ne__(self, other):
+        bits = self._other_bits(other)
+        return NotImplemented if bits is None else self._bits != bits
 
     def __lt__(self, other):
-        # This function is needed by functools.total_ordering.
-        if isinstance(other, _Offset):
-            return (self.byte, self.bit) < (other.byte, other.bit)
-        return (self.byte, self.bit) < (other, 0)
+        bits = self._other_bits(other)
+        return NotImplemented if bits is None else self._bits < bits
+
+    def __le__(self, other):
+        bits = self._other_bits(other)
+        return NotImplemented if bits is None else self._bits <= bits
+
+    def __gt__(self, other):
+        bits = self._other_bits(other)
+        return NotImplemented if bits is None else self._bits > bits
+
+    def __ge__(self, other):
+        bits = self._other_bits(other)
+        return NotImplemented if bits is None else self._bits >= bits
 
     def __add__(self, other):
         if isinstance(other, _Offset):
-            bit = self.bit + other.bit
-            byte = self.byte + other.byte + (bit >> 3)
-            bit &= 0b111
-            return self.__class__(byte=byte, bit=bit)
-        return self.__class__(byte=(self.byte + other), bit=self.bit)
+            return self._from_bits(self._bits + other._bits)
+        return self._from_bits(self._bits + (operator.index(other) << 3))
 
     def __radd__(self, other):
-        return self + self.__class__(byte=other)
+        return self._from_bits((operator.index(other) << 3) + self._bits)
 
     def __sub__(self, other):
         if isinstance(other, _Offset):
-            bit = self.bit - other.bit
-            byte = self.byte - other.byte
-            if bit < 0:
-                bit = 8 + bit
-                byte -= 1
-            return self.__class__(byte=byte, bit=bit)
-        return self.__class__(byte=(self.byte - other), bit=self.bit)
+            return self._from_bits(self._bits - other._bits)
+        return self._from_bits(self._bits - (operator.index(other) << 3))
 
     def __rsub__(self, other):
-        return self.__class__(byte=(other - self.byte), bit=self.bit)
+        return self._from_bits((operator.index(other) << 3) - self._bits)
 
     def aligned(self):
-        return (self.bit == 0)
+        return not (self._bits & 0b111)
 
     @abc.abstractmethod
     def rounded(self):
@@ -84,10 +119,14 @@ class _Offset(metaclass=abc.ABCMeta):
 
 
 class Offset(_Offset):
+    __slots__ = ()
+
     def rounded(self):
-        return self.byte
+        return self._bits >> 3
 
 
 class Size(_Offset):
+    __slots__ = ()
+
     def rounded(self):
-        return self.byte + (1 if self.bit else 0)
+        return (self._bits + 0b111) >> 3
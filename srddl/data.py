@@ -1,18 +1,46 @@
+import array
+import bisect
+import bz2
 import collections
+import lzma
 import mmap
 import math
 import os
+import random
+import stat
 import struct as _struct
 import string
+import sys
+import time
+import zlib
 
 import srddl.core.helpers as sch
 import srddl.exceptions as se
 
 from srddl.core.fields import BoundValue
 from srddl.core.offset import Offset, Size
+from srddl.core.signals import Signal
 
 class Data:
     class MappedData(dict):
+        '''
+        Structures mapped on the data, by offset. The structures are also kept
+        in an interval index sorted by offset, updated on insertion, so they
+        are iterated in order and the structures covering an offset are found
+        by bisection. The end of a structure is computed (and cached) on the
+        first query that needs it, along with the running maximum of the ends,
+        so each query only walks back over the structures that may overlap.
+        '''
+
+        def __init__(self):
+            super().__init__()
+            # Parallel lists: offsets of the structures in bits, structures,
+            # ends in bits (None until computed) and maximum of the ends of
+            # the structures before, up to ``self._clean`` (excluded).
+            self._starts, self._structs = [], []
+            self._ends, self._max_ends = [], []
+            self._clean = 0
+
         def __getitem__(self, key):
             if isinstance(key, tuple):
                 offset, fltr = key
@@ -20,20 +48,73 @@ class Data:
                 offset, fltr = key, None
             offset = Offset(offset)
             res = super().__getitem__(offset)
-            res = [x for x in res if fltr is None or fltr(x)]
+            if fltr is not None:
+                res = [x for x in map(_resolve, res) if fltr(x)]
             if len(res) == 1:
-                return res[0]
+                return _resolve(res[0])
             raise se.NoMappedDataError(offset)
 
+        def lookup(self, key, default=None):
+            '''
+            Returns the structure at ``key`` like ``self[key]``, or ``default``
+            if there isn't exactly one structure at the offset (matching the
+            filter).
+            '''
+            if isinstance(key, tuple):
+                offset, fltr = key
+            else:
+                offset, fltr = key, None
+            res = dict.get(self, Offset(offset), ())
+            if fltr is not None:
+                res = [x for x in map(_resolve, res) if fltr(x)]
+            return _resolve(res[0]) if len(res) == 1 else default
+
+        def __setitem__(self, offset, structs):
+            offset = Offset(offset)
+            if offset in self:
+                self._remove(offset)
+            super().__setitem__(offset, structs)
+            bits = offset._bits
+            pos = bisect.bisect_right(self._starts, bits)
+            self._starts[pos:pos] = [bits] * len(structs)
+            self._structs[pos:pos] = structs
+            self._ends[pos:pos] = [None] * len(structs)
+            self._max_ends[pos:pos] = [None] * len(structs)
+            self._clean = min(self._clean, pos)
+
+        def __delitem__(self, offset):
+            offset = Offset(offset)
+            super().__delitem__(offset)
+            self._remove(offset)
+
+        def _remove(self, offset):
+            bits = offset._bits
+            lo = bisect.bisect_left(self._starts, bits)
+            hi = bisect.bisect_right(self._starts, bits, lo)
+            for lst in [self._starts, self._structs, self._ends,
+                        self._max_ends]:
+                del lst[lo:hi]
+            self._clean = min(self._clean, lo)
+
+        def clear(self):
+            super().clear()
+            self._starts, self._structs = [], []
+            self._ends, self._max_ends = [], []
+            self._clean = 0
+
         def keys(self):
-            for offset in sorted(super().keys()):
-                if len(super().__getitem__(offset)) == 1:
+            idx = 0
+            while idx < len(self._starts):
+                offset = Offset._from_bits(self._starts[idx])
+                structs = super().__getitem__(offset)
+                if len(structs) == 1:
                     # XXX: Should we yield with a None filter to make fetching
                     #      of offsets easier? (not two cases to manage)
                     yield offset
                 else:
-                    for s in self[offset]:
-                        yield (offset, lambda t: t is s)
+                    for s in map(_resolve, structs):
+                        yield (offset, lambda t, s=s: t is s)
+                idx += len(structs)
 
         def values(self):
             for _, item in self.items():
@@ -43,9 +124,147 @@ class Data:
             for key in self.keys():
                 yield (key, self.__getitem__(key))
 
-    def __init__(self, buf, ro=False):
+        def ordered(self):
+            '''Yields the offsets and the structures, ordered by offset.'''
+            for bits, s in zip(self._starts, self._structs):
+                yield (Offset._from_bits(bits), _resolve(s))
+
+        def _update(self):
+            ends, max_ends, structs = self._ends, self._max_ends, self._structs
+            cur = max_ends[self._clean - 1] if self._clean else -1
+            for idx in range(self._clean, len(structs)):
+                if ends[idx] is None:
+                    ends[idx] = self._starts[idx] + structs[idx]['size']._bits
+                cur = max_ends[idx] = max(cur, ends[idx])
+            self._clean = len(structs)
+
+        def between(self, start, end=None):
+            '''
+            Returns the structures overlapping the range from ``start`` to
+            ``end`` (excluded, end of the data if None), in the order of their
+            offsets.
+            '''
+            start, hi = Offset(start)._bits, len(self._starts)
+            if end is not None:
+                hi = bisect.bisect_left(self._starts, Offset(end)._bits)
+            self._update()
+            res, idx = [], hi - 1
+            while 0 <= idx and start < self._max_ends[idx]:
+                if start < self._ends[idx]:
+                    res.append(_resolve(self._structs[idx]))
+                idx -= 1
+            res.reverse()
+            return res
+
+        def at(self, offset):
+            '''Returns the structures covering ``offset``, in order.'''
+            offset = Offset(offset)
+            return self.between(offset, offset + Size._from_bits(1))
+
+        def fields_at(self, offset):
+            '''
+            Returns, for each structure covering ``offset``, the list made of
+            the structure and the bound values of the fields covering
+            ``offset``, from the outermost to the innermost field.
+            '''
+            bits = Offset(offset)._bits
+            return [[s] + _fields_at(s, bits) for s in self.at(offset)]
+
+        def resized(self, struct):
+            '''Forgets the end of ``struct`` after its size changed.'''
+            bits = struct['offset']._bits
+            lo = bisect.bisect_left(self._starts, bits)
+            hi = bisect.bisect_right(self._starts, bits, lo)
+            for idx in range(lo, hi):
+                s = self._structs[idx]
+                if s is struct or getattr(s, 'struct', None) is struct:
+                    self._ends[idx] = None
+                    self._clean = min(self._clean, idx)
+
+        def splice(self, data, offset, removed, inserted):
+            '''
+            Updates the structures after ``removed`` bytes at ``offset`` were
+            replaced by ``inserted`` bytes. Structures after the bytes removed
+            are moved without mapping them again: they are replaced by
+            structures mapped at their new offset on first use (like restored
+            structures). Structures starting in the bytes removed are removed,
+            and structures over ``offset`` are mapped again.
+            '''
+            bits, end = Offset(offset)._bits, Offset(offset + removed)._bits
+            delta = (inserted - removed) << 3
+            covering = self.between(offset, offset)
+            self._update()
+            lo = bisect.bisect_left(self._starts, bits)
+            for start in self._starts[lo:]:
+                dict.pop(self, Offset._from_bits(start), None)
+            starts, structs, ends = [], [], []
+            for start, s, s_end in zip(self._starts[lo:], self._structs[lo:],
+                                       self._ends[lo:]):
+                if start < end:
+                    # The structure starts in the bytes removed.
+                    continue
+                new = Offset._from_bits(start + delta)
+                pending = s.__class__ is _PendingStruct
+                if delta and pending and s.struct is None:
+                    s.offset = new
+                elif delta:
+                    klass = s.klass if pending else type(s)
+                    size = Size._from_bits(s_end - start)
+                    s = _PendingStruct(data, klass, new, size)
+                starts.append(new._bits)
+                structs.append(s)
+                ends.append(s_end + delta)
+                dict.setdefault(self, new, []).append(s)
+            self._starts[lo:], self._structs[lo:] = starts, structs
+            self._ends[lo:] = ends
+            self._max_ends[lo:] = [None] * len(starts)
+            self._clean = min(self._clean, lo)
+            for s in covering:
+                s._srddl.remap(0)
+                self.resized(s)
+
+        def restore(self, data, entries):
+            '''
+            Adds structures that were mapped on the data before, from an
+            iterable of (class, offset, size) in the order of offsets. They are
+            only mapped (without calling their ``_setup``) when they are first
+            returned, and their size is known until then.
+            '''
+            for klass, offset, size in entries:
+                offset = Offset(offset)
+                s = _PendingStruct(data, klass, offset, Size(size))
+                structs = dict.get(self, offset)
+                if structs is None:
+                    dict.__setitem__(self, offset, [s])
+                else:
+                    structs.append(s)
+                pos = len(self._starts)
+                if pos and offset._bits < self._starts[-1]:
+                    pos = bisect.bisect_right(self._starts, offset._bits)
+                    self._clean = min(self._clean, pos)
+                self._starts.insert(pos, offset._bits)
+                self._structs.insert(pos, s)
+                self._ends.insert(pos, offset._bits + s.size._bits)
+                self._max_ends.insert(pos, None)
+
+        def entries(self):
+            '''
+            Yields the class, the offset and the size of the structures, in the
+            order of offsets, without mapping restored structures.
+            '''
+            self._update()
+            for bits, s, end in zip(self._starts, self._structs, self._ends):
+                klass = s.klass if s.__class__ is _PendingStruct else type(s)
+                yield (klass, Offset._from_bits(bits),
+                       Size._from_bits(end - bits))
+
+    def __init__(self, buf, ro=False, zero_copy=False):
         self.ro, self.mapped, self.buf = ro, Data.MappedData(), buf
 
+        # In zero-copy mode, byte arrays and raw values are read-only views of
+        # the buffer (see slice_from).
+        self.zero_copy, self._view = zero_copy, None
+
         # If filename is not defined, default to None.
         if not hasattr(self, 'filename'):
             self.filename = None
@@ -62,34 +281,419 @@ class Data:
 
     def map(self, offset, struct):
         offset = Offset(offset)
-        s = struct(self, offset)
+        return self._register(offset, struct(self, offset))
+
+    def _register(self, offset, s):
         self.mapped[offset] = self.mapped.get(offset, []) + [s]
         s._setup(self)
         return s
 
-    def map_array(self, offset, nb, struct):
+    def map_array(self, offset, nb, struct, index=None):
+        offset, size = Offset(offset), struct.static_size()
+        if size is not None:
+            # The offset of each structure is known without reading the size
+            # of the previous ones (lazy structures are not mapped).
+            for idx in range(nb):
+                s_offset = offset + Size._from_bits(idx * size._bits)
+                self.map(s_offset, struct)
+                if index is not None:
+                    index.append(s_offset, size)
+            return
+        for _ in range(nb):
+            size = self.map(offset, struct)['size']
+            if index is not None:
+                index.append(offset, size)
+            offset += size
+
+    def map_fill_array(self, offset, size, struct, index=None):
+        offset, (end, last) = Offset(offset), self._fill_bounds(size, struct)
+        while offset._bits < end and offset._bits <= last:
+            try:
+                s_size = self.map(offset, struct)['size']
+            except _struct.error:
+                # Only a truncated structure at the end of the data fails.
+                break
+            if index is not None:
+                index.append(offset, s_size)
+            offset += s_size
+
+    def iter_array(self, offset, nb, struct, index=None):
+        '''
+        Yields ``nb`` structures of class ``struct`` one after the other from
+        ``offset``, like :meth:`map_array`, but without keeping them in
+        ``mapped`` (nor calling their ``_setup``), so they are released once
+        processed. The offsets and sizes of the structures are appended to
+        ``index`` (see :class:`OffsetIndex` and :class:`CheckpointIndex`) if
+        given, like with :meth:`map_array` and :meth:`map_fill_array`.
+        '''
         offset = Offset(offset)
         for _ in range(nb):
-            offset += self.map(offset, struct)['size']
+            s = struct(self, offset)
+            size = s['size']
+            if index is not None:
+                index.append(offset, size)
+            yield s
+            offset += size
 
-    def map_fill_array(self, offset, size, struct):
-        offset, size = Offset(offset), Size(size)
-        while size < 0 or offset < size:
+    def iter_fill_array(self, offset, size, struct, index=None):
+        '''
+        Yields structures of class ``struct`` one after the other from
+        ``offset`` until ``size`` (or the end of the data if negative), like
+        :meth:`map_fill_array`. See :meth:`iter_array`.
+        '''
+        offset, (end, last) = Offset(offset), self._fill_bounds(size, struct)
+        while offset._bits < end and offset._bits <= last:
             try:
-                offset += self.map(offset, struct)['size']
+                s = struct(self, offset)
+                s_size = s['size']
             except _struct.error:
                 break
+            if index is not None:
+                index.append(offset, s_size)
+            yield s
+            offset += s_size
+
+    def _fill_bounds(self, size, struct):
+        # Structures are mapped while they start before ``size`` (the end of
+        # the data if negative) and at most at the last offset (in bits) where
+        # they fit in the data, so that filling the data to its end doesn't
+        # stop on an exception.
+        length = len(self) << 3
+        end = length if size < 0 else Size(size)._bits
+        size = struct.static_size()
+        return end, length - (1 if size is None else size._bits)
 
     def unpack_from(self, frmt, offset):
+        if isinstance(frmt, _struct.Struct):
+            return frmt.unpack_from(self.buf, offset)
         return _struct.unpack_from(frmt, self.buf, offset)
 
+    def slice_from(self, offset, size):
+        '''
+        Returns a read-only memoryview of ``size`` bytes at ``offset`` in the
+        buffer, without copying them. Like ``unpack_from``, it raises
+        :class:`struct.error` when the buffer is too short.
+        '''
+        if self._view is None:
+            self._view = memoryview(self.buf).toreadonly()
+        if offset < 0 or len(self._view) < offset + size:
+            msg = 'slice_from requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + size))
+        return self._view[offset:offset + size]
+
     def pack_into(self, frmt, offset, *args):
         if self.ro:
             raise se.DataIsROError(self, offset)
         _struct.pack_into(frmt, self.buf, offset, *args)
 
+    def buffer(self):
+        '''
+        Returns an object supporting the buffer protocol with all the bytes of
+        the data, or None if they are not stored contiguously.
+        '''
+        return self.buf
+
+    def refresh(self):
+        '''
+        Updates the length of the data when its source changed, like a file
+        still being written, and returns True if it changed.
+        '''
+        return False
+
+    def view(self, offset, size):
+        '''
+        Returns the ``size`` bytes at ``offset`` as a :class:`SubData`, sharing
+        the bytes of the data, with its own mapped structures.
+        '''
+        return SubData(self, offset, size)
+
+    def columns(self, struct):
+        '''
+        Exports the structures of class ``struct`` mapped on the data as
+        columns, one per field (see :mod:`srddl.columns`).
+        '''
+        import srddl.columns as scol
+        structs, offsets = [], []
+        mapped = self.mapped
+        for bits, s in zip(mapped._starts, mapped._structs):
+            if s.__class__ is _PendingStruct:
+                # Restored structures are only mapped if some fields need it.
+                if s.struct is None and s.klass is struct:
+                    structs.append(bits >> 3)
+                    offsets.append(bits >> 3)
+                    continue
+                s = s.resolve()
+            if type(s) is struct:
+                structs.append(s)
+                offsets.append(bits >> 3)
+        return scol.columns(self, struct, structs, offsets)
+
     def close(self):
-        pass
+        # Mapped structures keep their decoded values, so they are released
+        # with the data.
+        self.mapped.clear()
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+
+class SubData(Data):
+    '''
+    Data made of ``size`` bytes at ``offset`` in the data ``parent``, like a
+    file embedded in another one, without copying them: offsets in the
+    sub-data are relative to its start. When the bytes of the parent are
+    always in its buffer (like :class:`FileData`), the sub-data uses a
+    memoryview of it, else the reads and writes are translated to the
+    parent. Sub-data of sub-data still use the buffer (or the data) of the
+    outermost data.
+    '''
+
+    def __new__(cls, parent, offset, size):
+        # Checked before the sub-data exists, so that no view of the buffer of
+        # the parent is left behind.
+        if offset < 0 or size < 0 or len(parent) < offset + size:
+            raise IndexError('sub-data out of range')
+        return super().__new__(cls)
+
+    def __init__(self, parent, offset, size):
+        self.parent, self.start, self._size = parent, offset, size
+        # Data overriding buffer() may not keep their bytes in their buffer
+        # (only while they are not edited, for some of them).
+        buf = parent.buffer() if type(parent).buffer is Data.buffer else None
+        if buf is not None:
+            buf = memoryview(buf)[offset:offset + size]
+        elif isinstance(parent, SubData):
+            self.parent, self.start = parent.parent, parent.start + offset
+        super().__init__(buf, zero_copy=parent.zero_copy)
+        self.ro = parent.ro
+
+    def __len__(self):
+        return self._size
+
+    def absolute(self, offset):
+        '''Returns the offset in the outermost data of ``offset``.'''
+        res, data = offset + self.start, self.parent
+        while isinstance(data, SubData):
+            res, data = res + data.start, data.parent
+        return res
+
+    def _check(self, offset, size):
+        if offset < 0 or self._size < offset + size:
+            msg = 'sub-data requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + size))
+
+    def unpack_from(self, frmt, offset):
+        if self.buf is not None:
+            return super().unpack_from(frmt, offset)
+        if not isinstance(frmt, _struct.Struct):
+            frmt = _struct.Struct(frmt)
+        self._check(offset, frmt.size)
+        return self.parent.unpack_from(frmt, self.start + offset)
+
+    def slice_from(self, offset, size):
+        if self.buf is not None:
+            return super().slice_from(offset, size)
+        self._check(offset, size)
+        return self.parent.slice_from(self.start + offset, size)
+
+    def pack_into(self, frmt, offset, *args):
+        if self.buf is not None:
+            return super().pack_into(frmt, offset, *args)
+        self._check(offset, _struct.calcsize(frmt))
+        return self.parent.pack_into(frmt, self.start + offset, *args)
+
+    def close(self):
+        super().close()
+        if self.buf is not None:
+            try:
+                self.buf.release()
+            except BufferError:
+                pass
+
+
+class _PendingStruct:
+    '''Structure restored in ``Data.mapped``, mapped on first use.'''
+
+    __slots__ = ('data', 'klass', 'offset', 'size', 'struct')
+
+    def __init__(self, data, klass, offset, size):
+        self.data, self.klass = data, klass
+        self.offset, self.size = offset, size
+        self.struct = None
+
+    def __getitem__(self, item):
+        # The size is known without mapping the structure (see _update).
+        if item == 'size':
+            return self.size
+        return self.resolve()[item]
+
+    def resolve(self):
+        if self.struct is None:
+            self.struct = self.klass(self.data, self.offset)
+        return self.struct
+
+
+def _resolve(s):
+    return s.resolve() if s.__class__ is _PendingStruct else s
+
+
+def _fields_at(struct, bits):
+    import srddl.fields as sf
+    import srddl.models as sm
+    res, items = [], [getattr(struct, name) for name in struct['fields']]
+    while items is not None:
+        bv = _covering(items, bits)
+        if bv is None:
+            break
+        res.append(bv)
+        if isinstance(bv, sf.ArrayFieldBoundValue):
+            items = bv
+        elif isinstance(bv['value'], sm.Struct):
+            value = bv['value']
+            items = [getattr(value, name) for name in value['fields']]
+        else:
+            items = None
+    return res
+
+
+def _covering(items, bits):
+    # Bound values are sorted by offset, so the last one starting before the
+    # offset is the only one that may cover it.
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if items[mid]['offset']._bits <= bits:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo:
+        bv = items[lo - 1]
+        if bits < bv['offset']._bits + bv['size']._bits:
+            return bv
+    return None
+
+
+class OffsetIndex:
+    '''
+    Compact index of the offsets and sizes of structures, appended in the
+    order of their offsets. They are stored in two arrays of integers (number
+    of bits), so an entry takes 16 bytes.
+    '''
+
+    def __init__(self):
+        self.offsets, self.sizes = array.array('Q'), array.array('Q')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, idx):
+        return (Offset._from_bits(self.offsets[idx]),
+                Size._from_bits(self.sizes[idx]))
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def append(self, offset, size):
+        self.offsets.append(Offset(offset)._bits)
+        self.sizes.append(Size(size)._bits)
+
+    def find(self, offset):
+        '''
+        Returns the index of the entry containing ``offset``, or None if no
+        entry contains it.
+        '''
+        bits = Offset(offset)._bits
+        idx = bisect.bisect_right(self.offsets, bits) - 1
+        if 0 <= idx and bits < self.offsets[idx] + self.sizes[idx]:
+            return idx
+        return None
+
+
+class CheckpointIndex:
+    '''
+    Skip index of an array of structures with variable sizes: it keeps the
+    offset of every ``step``-th structure appended (like :class:`OffsetIndex`,
+    it is given as the ``index`` of the mapping of the array), so a structure
+    is found by decoding at most ``step - 1`` structures from the nearest
+    checkpoint, instead of all the structures before it.
+
+    The index is serialized with :meth:`tobytes` and :meth:`frombytes`, to
+    be reused when the data is opened again.
+    '''
+
+    _HEADER = _struct.Struct('<8sIIQQ')
+    _MAGIC, _VERSION = b'SRDDLCKP', 1
+
+    def __init__(self, step=1024):
+        if step < 1:
+            raise ValueError("'step' must be positive.")
+        self.step, self.offsets = step, array.array('Q')
+        # Number of structures appended, and end of the last one in bits.
+        self._count, self._end = 0, 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def end(self):
+        '''Offset of the end of the last structure appended.'''
+        return Offset._from_bits(self._end)
+
+    def append(self, offset, size):
+        offset = Offset(offset)
+        if self._count % self.step == 0:
+            self.offsets.append(offset._bits)
+        self._count += 1
+        self._end = offset._bits + Size(size)._bits
+
+    def locate(self, data, struct, idx):
+        '''
+        Returns the offset of the structure at index ``idx`` of the array of
+        structures of class ``struct`` in ``data``. Structures between the
+        checkpoint and the structure are decoded with the decoder of the class
+        (see :mod:`srddl.decoders`).
+        '''
+        import srddl.decoders as sdec
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+        checkpoint, skip = divmod(idx, self.step)
+        offset = Offset._from_bits(self.offsets[checkpoint])
+        if skip:
+            decode = sdec.decoder(struct)
+            for _ in range(skip):
+                offset += decode(data, offset)._size
+        return offset
+
+    def tobytes(self):
+        '''Returns the index serialized as bytes.'''
+        offsets = array.array('Q', self.offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        header = self._HEADER.pack(self._MAGIC, self._VERSION, self.step,
+                                   self._count, self._end)
+        return header + offsets.tobytes()
+
+    @classmethod
+    def frombytes(cls, raw):
+        '''Returns the index serialized in ``raw`` by :meth:`tobytes`.'''
+        if len(raw) < cls._HEADER.size:
+            raise se.InvalidIndexError('truncated header')
+        magic, version, step, count, end = cls._HEADER.unpack_from(raw)
+        if magic != cls._MAGIC or version != cls._VERSION:
+            raise se.InvalidIndexError('unknown format')
+        raw, res = raw[cls._HEADER.size:], cls(step)
+        if len(raw) % res.offsets.itemsize:
+            raise se.InvalidIndexError('truncated checkpoints')
+        res.offsets.frombytes(raw)
+        if sys.byteorder != 'little':
+            res.offsets.byteswap()
+        if len(res.offsets) != (count + step - 1) // step:
+            raise se.InvalidIndexError('wrong number of checkpoints')
+        res._count, res._end = count, end
+        return res
 
 
 class DataView:
@@ -182,17 +786,996 @@ class FileData(Data):
         RDWR=('r+b', mmap.PROT_READ | mmap.PROT_WRITE),
     )
 
-    def __init__(self, filename, mode=Mode.RDONLY):
+    def __init__(self, filename, mode=Mode.RDONLY, zero_copy=False):
         self.f, self.filename = open(filename, mode[0]), filename
-        super().__init__(mmap.mmap(self.f.fileno(), 0, prot=mode[1]))
+        self._prot = mode[1]
+        super().__init__(mmap.mmap(self.f.fileno(), 0, prot=mode[1]),
+                         zero_copy=zero_copy)
+        # The length is the size of the mapping, updated by refresh.
+        self._size = len(self.buf)
 
     def __len__(self):
-        return os.path.getsize(self.filename)
+        return self._size
+
+    def refresh(self):
+        '''Maps the file again if its size changed since it was mapped.'''
+        size = os.fstat(self.f.fileno()).st_size
+        if size == self._size or not size:
+            return False
+        self.flush()
+        buf = self.buf
+        self.buf = mmap.mmap(self.f.fileno(), 0, prot=self._prot)
+        self._size, self._view = len(self.buf), None
+        self._close_map(buf)
+        return True
 
     def close(self):
+        super().close()
         self.flush()
-        self.buf.close()
+        self._close_map(self.buf)
         self.f.close()
 
+    def _close_map(self, buf):
+        try:
+            buf.close()
+        except BufferError:
+            # Zero-copy values still use the mapping, it is closed when they
+            # are released.
+            pass
+
     def flush(self):
         self.buf.flush()
+
+
+class Follower:
+    '''
+    Maps the structures of class ``struct`` one after the other from
+    ``offset``, like :meth:`Data.map_fill_array`, as they are written at the
+    end of a file still being written (like a capture of tcpdump). Each
+    :meth:`poll` refreshes the data (see :meth:`Data.refresh`) and only maps
+    the structures written since the last one, and :meth:`run` polls every
+    ``interval`` seconds.
+
+    The signal ``mapped`` of ``signals`` is triggered with the list of the
+    structures mapped, by batches of at most ``batch`` structures. A structure
+    that is not completely written yet is only mapped once it is.
+    '''
+
+    def __init__(self, data, offset, struct, index=None, interval=1.0,
+                 batch=1024):
+        self.data, self.offset, self.struct = data, Offset(offset), struct
+        self.index, self.interval, self.batch = index, interval, batch
+        self.signals = Signal('mapped')
+
+    def poll(self):
+        '''Maps the new structures, and returns how many were mapped.'''
+        data, offset, count = self.data, self.offset, 0
+        data.refresh()
+        length, new = len(data) << 3, []
+        while offset._bits < length:
+            try:
+                s = self.struct(data, offset)
+                size = s['size']
+            except _struct.error:
+                break
+            if length < offset._bits + size._bits:
+                # The end of the structure is not written yet.
+                break
+            data._register(offset, s)
+            if self.index is not None:
+                self.index.append(offset, size)
+            new.append(s)
+            offset += size
+            if len(new) == self.batch:
+                self.offset, count = offset, count + len(new)
+                self.signals.trigger('mapped', new)
+                new = []
+        self.offset, count = offset, count + len(new)
+        if new:
+            self.signals.trigger('mapped', new)
+        return count
+
+    def run(self, stop=None):
+        '''Polls the data until ``stop()`` returns True (forever if None).'''
+        while True:
+            self.poll()
+            if stop is not None and stop():
+                return
+            time.sleep(self.interval)
+
+
+class OverlayData(Data):
+    '''
+    Data editing a read-only base buffer (like a file mapped read-only, see
+    :meth:`from_file`) with a copy-on-write overlay: written bytes are kept in
+    memory as a sorted list of extents (merged when they overlap or touch), and
+    reads outside of the extents are done in the base buffer.
+
+    Writes are recorded in snapshots: :meth:`snapshot` starts a new one,
+    :meth:`undo` reverts the writes of the last snapshot and :meth:`redo`
+    writes them again. The file is only written by :meth:`save`.
+    '''
+
+    # Size of the blocks written when saving to another file.
+    BLOCK_SIZE = 1 << 20
+
+    def __init__(self, buf, filename=None, zero_copy=False):
+        if filename is not None:
+            self.filename = filename
+        super().__init__(buf, zero_copy=zero_copy)
+        self.ro = False
+        self._starts, self._extents = [], []
+        self._history, self._redo, self._open = [], [], False
+
+    @classmethod
+    def from_file(cls, filename, zero_copy=False):
+        '''Returns an overlay on the file ``filename``, mapped read-only.'''
+        return cls(_map_file(filename), filename=filename, zero_copy=zero_copy)
+
+    @property
+    def dirty(self):
+        '''List of the offsets and sizes of the extents written.'''
+        return [(start, len(ext))
+                for start, ext in zip(self._starts, self._extents)]
+
+    def _overlaps(self, offset, end):
+        idx = bisect.bisect_left(self._starts, end) - 1
+        if idx < 0:
+            return False
+        return offset < self._starts[idx] + len(self._extents[idx])
+
+    def read(self, offset, size):
+        '''Returns ``size`` bytes at ``offset``, with the writes applied.'''
+        end = offset + size
+        idx = bisect.bisect_right(self._starts, offset) - 1
+        if 0 <= idx:
+            start, ext = self._starts[idx], self._extents[idx]
+            if end <= start + len(ext):
+                return bytes(ext[offset - start:end - start])
+        res, idx = bytearray(self.buf[offset:end]), max(idx, 0)
+        while idx < len(self._starts) and self._starts[idx] < end:
+            start, ext = self._starts[idx], self._extents[idx]
+            lo = max(start, offset)
+            hi = min(start + len(ext), end, offset + len(res))
+            if lo < hi:
+                res[lo - offset:hi - offset] = ext[lo - start:hi - start]
+            idx += 1
+        return bytes(res)
+
+    def unpack_from(self, frmt, offset):
+        if not isinstance(frmt, _struct.Struct):
+            frmt = _struct.Struct(frmt)
+        if not self._overlaps(offset, offset + frmt.size):
+            return frmt.unpack_from(self.buf, offset)
+        return frmt.unpack_from(self.read(offset, frmt.size), 0)
+
+    def slice_from(self, offset, size):
+        if not self._overlaps(offset, offset + size):
+            return super().slice_from(offset, size)
+        if offset < 0 or len(self) < offset + size:
+            msg = 'slice_from requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + size))
+        return memoryview(self.read(offset, size))
+
+    def pack_into(self, frmt, offset, *args):
+        self.write(offset, _struct.pack(frmt, *args))
+
+    def write(self, offset, raw):
+        '''Writes the bytes ``raw`` at ``offset`` in the overlay.'''
+        if offset < 0 or len(self) < offset + len(raw):
+            msg = 'write requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + len(raw)))
+        if not self._open:
+            self._history.append([])
+            self._open = True
+        old = self.read(offset, len(raw))
+        self._history[-1].append((offset, old, bytes(raw)))
+        self._redo = []
+        self._write(offset, raw)
+
+    def _write(self, offset, raw):
+        # Extents overlapping or touching the bytes written are merged with
+        # them, into one contiguous extent.
+        starts, extents, end = self._starts, self._extents, offset + len(raw)
+        hi = lo = bisect.bisect_right(starts, end)
+        while 0 < lo and offset <= starts[lo - 1] + len(extents[lo - 1]):
+            lo -= 1
+        if lo == hi:
+            starts.insert(lo, offset)
+            extents.insert(lo, bytearray(raw))
+            return
+        start = min(offset, starts[lo])
+        stop = max(end, starts[hi - 1] + len(extents[hi - 1]))
+        ext = bytearray(stop - start)
+        for idx in range(lo, hi):
+            pos = starts[idx] - start
+            ext[pos:pos + len(extents[idx])] = extents[idx]
+        ext[offset - start:end - start] = raw
+        starts[lo:hi], extents[lo:hi] = [start], [ext]
+
+    def buffer(self):
+        return None if self._starts else self.buf
+
+    def snapshot(self):
+        '''Starts a new snapshot: the next writes are undone together.'''
+        self._open = False
+
+    def undo(self):
+        '''Reverts the writes of the last snapshot, returns False if none.'''
+        self._open = False
+        if not self._history:
+            return False
+        edits = self._history.pop()
+        for offset, old, _ in reversed(edits):
+            self._write(offset, old)
+            self._touched(offset, len(old))
+        self._redo.append(edits)
+        return True
+
+    def redo(self):
+        '''Writes again the last snapshot undone, and returns False if none.'''
+        self._open = False
+        if not self._redo:
+            return False
+        edits = self._redo.pop()
+        for offset, _, new in edits:
+            self._write(offset, new)
+            self._touched(offset, len(new))
+        self._history.append(edits)
+        return True
+
+    def _touched(self, offset, size):
+        # Structures over bytes changed without their fields are mapped again.
+        for s in self.mapped.between(offset, offset + size):
+            s._srddl.remap(0)
+            self.mapped.resized(s)
+
+    def save(self, filename=None):
+        '''
+        Saves the data to ``filename``, by default the file of the data. Only
+        the extents are written to the file of the data. Another file is
+        written completely, block by block.
+        '''
+        if filename is None and self.filename is None:
+            raise se.NoFilenameError(self)
+        if filename is None or (self.filename is not None and
+                                os.path.exists(filename) and
+                                os.path.samefile(filename, self.filename)):
+            with open(self.filename, 'r+b') as f:
+                for start, ext in zip(self._starts, self._extents):
+                    f.seek(start)
+                    f.write(ext)
+            if isinstance(self.buf, mmap.mmap):
+                # The mapping of the file now holds the writes.
+                self._starts, self._extents = [], []
+            return
+        with open(filename, 'wb') as f:
+            for offset in range(0, len(self), self.BLOCK_SIZE):
+                size = min(self.BLOCK_SIZE, len(self) - offset)
+                f.write(self.read(offset, size))
+
+    def close(self):
+        super().close()
+        if isinstance(self.buf, mmap.mmap):
+            try:
+                self.buf.close()
+            except BufferError:
+                pass
+
+
+class PieceTableData(Data):
+    '''
+    Data supporting insertion and deletion of bytes, without moving the bytes
+    after them. The data is a sequence of pieces, each one a range of the
+    original buffer (left untouched, like a file mapped read-only, see
+    :meth:`from_file`) or of the buffer of the bytes added, which only grows.
+    The pieces are kept in a balanced tree (a treap) keyed by their offset, so
+    finding, inserting and deleting the bytes at an offset takes O(log n) for
+    n pieces.
+
+    Structures mapped after the bytes inserted or deleted are moved without
+    being mapped again (see :meth:`Data.MappedData.splice`). The file is only
+    written by :meth:`save`.
+    '''
+
+    # Size of the blocks written when saving.
+    BLOCK_SIZE = 1 << 20
+
+    def __init__(self, buf, filename=None, zero_copy=False):
+        if filename is not None:
+            self.filename = filename
+        super().__init__(buf, zero_copy=zero_copy)
+        self.ro, self._add = False, bytearray()
+        self._root = _Piece(buf, 0, len(buf)) if len(buf) else None
+
+    @classmethod
+    def from_file(cls, filename, zero_copy=False):
+        '''Returns a piece table on the file ``filename``, mapped read-only.'''
+        return cls(_map_file(filename), filename=filename, zero_copy=zero_copy)
+
+    def __len__(self):
+        return _total(self._root)
+
+    @property
+    def pieces(self):
+        '''Number of pieces of the data.'''
+        return sum(1 for _ in _pieces(self._root))
+
+    def read(self, offset, size):
+        '''Returns the ``size`` bytes at ``offset`` (less at the end).'''
+        node, pos = _find(self._root, offset)
+        if node is not None and pos + size <= node.length:
+            return bytes(node.buf[node.start + pos:node.start + pos + size])
+        res = []
+        _collect(self._root, offset, offset + size, res)
+        return b''.join(res)
+
+    def unpack_from(self, frmt, offset):
+        if not isinstance(frmt, _struct.Struct):
+            frmt = _struct.Struct(frmt)
+        if offset < 0:
+            raise _struct.error('offset {} out of range'.format(offset))
+        node, pos = _find(self._root, offset)
+        if node is not None and pos + frmt.size <= node.length:
+            return frmt.unpack_from(node.buf, node.start + pos)
+        return frmt.unpack_from(self.read(offset, frmt.size), 0)
+
+    def slice_from(self, offset, size):
+        if offset < 0 or len(self) < offset + size:
+            msg = 'slice_from requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + size))
+        node, pos = _find(self._root, offset)
+        if (node is not None and node.buf is self.buf and
+                pos + size <= node.length):
+            # Only the original buffer is shared, the buffer of the bytes
+            # added can't grow while views of it exist.
+            return super().slice_from(node.start + pos, size)
+        return memoryview(self.read(offset, size))
+
+    def pack_into(self, frmt, offset, *args):
+        raw = _struct.pack(frmt, *args)
+        if offset < 0 or len(self) < offset + len(raw):
+            msg = 'pack_into requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + len(raw)))
+        node, pos = _find(self._root, offset)
+        if (node is not None and node.buf is self._add and
+                pos + len(raw) <= node.length):
+            # Added bytes are only used by one piece, they are written over.
+            start = node.start + pos
+            self._add[start:start + len(raw)] = raw
+            return
+        left, right = _split(self._root, offset)
+        _, right = _split(right, len(raw))
+        self._root = _merge(_merge(left, self._added(raw)), right)
+
+    def insert(self, offset, raw):
+        '''Inserts the bytes ``raw`` at ``offset``.'''
+        if offset < 0 or len(self) < offset:
+            raise IndexError('insertion offset out of range')
+        if not raw:
+            return
+        left, right = _split(self._root, offset)
+        node = left
+        while node is not None and node.right is not None:
+            node = node.right
+        if (node is not None and node.buf is self._add and
+                node.start + node.length == len(self._add)):
+            # Bytes typed one after the other extend the same piece.
+            self._add += raw
+            node.length, node = node.length + len(raw), left
+            while node is not None:
+                node.total += len(raw)
+                node = node.right
+            self._root = _merge(left, right)
+        else:
+            self._root = _merge(_merge(left, self._added(raw)), right)
+        self.mapped.splice(self, offset, 0, len(raw))
+
+    def delete(self, offset, size):
+        '''Deletes the ``size`` bytes at ``offset``.'''
+        if offset < 0 or size < 0 or len(self) < offset + size:
+            raise IndexError('deletion range out of range')
+        left, right = _split(self._root, offset)
+        _, right = _split(right, size)
+        self._root = _merge(left, right)
+        self.mapped.splice(self, offset, size, 0)
+
+    def _added(self, raw):
+        res = _Piece(self._add, len(self._add), len(raw))
+        self._add += raw
+        return res
+
+    def buffer(self):
+        root = self._root
+        if root is None or (root.left is None and root.right is None and
+                            root.buf is self.buf and root.start == 0 and
+                            root.length == len(self.buf)):
+            return self.buf
+        return None
+
+    def save(self, filename=None):
+        '''
+        Writes the data to ``filename``, by default the file of the data. The
+        file is written to a temporary file first, that replaces it.
+        '''
+        filename = self.filename if filename is None else filename
+        if filename is None:
+            raise se.NoFilenameError(self)
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            for node in _pieces(self._root):
+                with memoryview(node.buf) as view:
+                    stop = node.start + node.length
+                    for start in range(node.start, stop, self.BLOCK_SIZE):
+                        end = min(start + self.BLOCK_SIZE, stop)
+                        f.write(view[start:end])
+        os.replace(tmp, filename)
+
+    def close(self):
+        super().close()
+        if isinstance(self.buf, mmap.mmap):
+            try:
+                self.buf.close()
+            except BufferError:
+                pass
+
+
+class PagedData(Data):
+    '''
+    Read-only data read by pages of ``page_size`` bytes, without mapping the
+    whole file. At most ``budget`` bytes of pages are kept in memory, the least
+    recently used pages are dropped first. When the pages are read in order,
+    ``read_ahead`` pages are read at once.
+
+    ``source`` is a file name, a file descriptor or a file object. Regular
+    files are read with :func:`os.pread`. Other sources (pipes, FIFOs, stdin)
+    are streams: they are read in order as pages are needed, so bytes dropped
+    from the cache can't be read again (see :class:`srddl.exceptions.
+    PageEvictedError`), and their length is ``sys.maxsize`` until their end is
+    read (filling the data with :meth:`iter_fill_array` stops at the end).
+    '''
+
+    def __init__(self, source, page_size=1 << 16, budget=1 << 24,
+                 read_ahead=4, zero_copy=False):
+        self._fd, self._own = source, False
+        if isinstance(source, str):
+            self.filename = source
+            self._fd, self._own = os.open(source, os.O_RDONLY), True
+        elif not isinstance(source, int):
+            self._fd = source.fileno()
+        super().__init__(None, zero_copy=zero_copy)
+        self.page_size, self.read_ahead = page_size, read_ahead
+        self.max_pages = max(budget // page_size, read_ahead + 1)
+        self._pages, self._next = collections.OrderedDict(), None
+        # Streams are read up to page ``_read``, their size is None until
+        # their end.
+        st = os.fstat(self._fd)
+        self.stream = not stat.S_ISREG(st.st_mode)
+        self._size = None if self.stream else st.st_size
+        self._read = 0
+
+    def __len__(self):
+        return sys.maxsize if self._size is None else self._size
+
+    def refresh(self):
+        if self.stream:
+            return False
+        size = os.fstat(self._fd).st_size
+        if size == self._size:
+            return False
+        # Pages from the last one may have been read before the end of the
+        # file.
+        last = self._size // self.page_size
+        for idx in [idx for idx in self._pages if last <= idx]:
+            del self._pages[idx]
+        self._size = size
+        return True
+
+    def _page(self, idx):
+        page = self._pages.get(idx)
+        if page is not None:
+            self._pages.move_to_end(idx)
+            return page
+        return self._load(idx)
+
+    def _load(self, idx):
+        if self.stream:
+            if idx < self._read:
+                raise se.PageEvictedError(self, idx * self.page_size)
+            while self._read <= idx and self._size is None:
+                page = self._read_stream()
+                self._store(self._read, page)
+                self._read += 1
+                if len(page) < self.page_size:
+                    self._size = (self._read - 1) * self.page_size + len(page)
+            return self._pages.get(idx, b'')
+        count = self.read_ahead if idx == self._next else 1
+        raw = os.pread(self._fd, count * self.page_size, idx * self.page_size)
+        for it in range(count):
+            page = raw[it * self.page_size:(it + 1) * self.page_size]
+            if not page:
+                # Past the end of the file, which may still grow.
+                break
+            self._store(idx + it, page)
+        self._next = idx + count
+        return self._pages.get(idx, b'')
+
+    def _read_stream(self):
+        res = []
+        size = self.page_size
+        while size:
+            raw = os.read(self._fd, size)
+            if not raw:
+                break
+            res.append(raw)
+            size -= len(raw)
+        return b''.join(res)
+
+    def _store(self, idx, page):
+        self._pages[idx] = page
+        while self.max_pages < len(self._pages):
+            self._pages.popitem(last=False)
+
+    def read(self, offset, size):
+        '''Returns the ``size`` bytes at ``offset`` (less at the end).'''
+        idx, pos = divmod(offset, self.page_size)
+        if pos + size <= self.page_size:
+            return self._page(idx)[pos:pos + size]
+        res = [self._page(idx)[pos:]]
+        size -= len(res[0])
+        while 0 < size:
+            idx += 1
+            page = self._page(idx)
+            if not page:
+                break
+            res.append(page[:size])
+            size -= len(res[-1])
+        return b''.join(res)
+
+    def unpack_from(self, frmt, offset):
+        if not isinstance(frmt, _struct.Struct):
+            frmt = _struct.Struct(frmt)
+        if offset < 0:
+            raise _struct.error('offset {} out of range'.format(offset))
+        idx, pos = divmod(offset, self.page_size)
+        if pos + frmt.size <= self.page_size:
+            return frmt.unpack_from(self._page(idx), pos)
+        return frmt.unpack_from(self.read(offset, frmt.size), 0)
+
+    def slice_from(self, offset, size):
+        idx, pos = divmod(offset, self.page_size)
+        if 0 <= offset and pos + size <= self.page_size:
+            # Pages are never modified, views keep them alive once dropped.
+            res = memoryview(self._page(idx))[pos:pos + size]
+        else:
+            res = memoryview(self.read(max(offset, 0), size))
+        if offset < 0 or len(res) < size:
+            msg = 'slice_from requires a buffer of at least {} bytes'
+            raise _struct.error(msg.format(offset + size))
+        return res
+
+    def buffer(self):
+        return None
+
+    def close(self):
+        super().close()
+        self._pages.clear()
+        if self._own and self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class CompressedData(PagedData):
+    '''
+    Read-only data decompressing a file compressed with gzip, bzip2 or xz by
+    pages, on demand (see :class:`PagedData`).
+
+    The file is decompressed once when it is opened, to find its length and
+    seek points: the offsets (decompressed and compressed) of the members of
+    the file, that are decompressed independently (concatenated gzip, bzip2
+    or xz files, like the ones of bgzip or pbzip2), and of the blocks of the
+    xz streams (like the ones of xz -T), found in the index of the streams.
+    They are saved in a sidecar index (see :func:`index_path`, ``index``
+    sets another path or False to not use one), so opening the file again
+    decompresses nothing. A page is decompressed from the nearest seek point
+    before it, or from where the last page read was decompressed when it is
+    closer, so sequential reads decompress the file once.
+
+    The decompressors of the standard library can't restart at the bit
+    offsets of the blocks of a gzip member (like the ones of pigz -i), and
+    their state can't be saved. For gzip, the state of the decompressor is
+    instead copied in memory every ``step`` decompressed bytes, as long as
+    the file is open.
+    '''
+
+    CODECS = collections.OrderedDict([
+        (b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'),
+    ])
+    SUFFIXES = ['.gz', '.bz2', '.xz']
+
+    # Size of the compressed blocks read.
+    BLOCK_SIZE = 1 << 14
+
+    _HEADER = _struct.Struct('<8sIIQQQ')
+    _MAGIC, _VERSION = b'SRDDLCMP', 1
+
+    def __init__(self, filename, index=None, page_size=1 << 16, budget=1 << 24,
+                 step=1 << 24, zero_copy=False):
+        super().__init__(filename, page_size=page_size, budget=budget,
+                         read_ahead=1, zero_copy=zero_copy)
+        self.codec = self.detect(os.pread(self._fd, 6, 0))
+        if self.codec is None:
+            self.close()
+            raise se.UnknownCompressionError(filename)
+        self.inner_filename = filename
+        for suffix in self.SUFFIXES:
+            if filename.endswith(suffix):
+                self.inner_filename = filename[:-len(suffix)]
+        st = os.fstat(self._fd)
+        self._identity = (st.st_size, st.st_mtime_ns)
+        if index is None:
+            index = index_path(filename)
+        self.index = index if index is not False else None
+        # Seek points (decompressed offset, compressed offset) at the start of
+        # each member and xz block, the xz blocks by offset, snapshots of the
+        # gzip decompressor by step, and state of the last decompression
+        # (decompressor, compressed offset, decompressed offset of its output,
+        # output not cut in pages yet).
+        self.points, self._blocks = [], dict()
+        self.step, self._snapshots = step, dict()
+        self._state, self._building = None, False
+        if not self._load_index():
+            self._build_index()
+            try:
+                self._save_index()
+            except OSError:
+                # The index is optional, the directory may be read-only.
+                pass
+        self._index_blocks()
+
+    @classmethod
+    def detect(cls, raw):
+        '''Returns the compression of ``raw`` (a prefix of a file), or None.'''
+        for magic, codec in cls.CODECS.items():
+            if raw.startswith(magic):
+                return codec
+        return None
+
+    def refresh(self):
+        return False
+
+    def _decompressor(self):
+        if self.codec == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.codec == 'bz2':
+            return bz2.BZ2Decompressor()
+        return lzma.LZMADecompressor()
+
+    def _build_index(self):
+        self.points, self._building = [(0, 0)], True
+        state = [self._decompressor(), 0, 0, bytearray()]
+        while self._advance(state, None):
+            pass
+        self._size, self._building = state[2] + len(state[3]), False
+
+    def _index_blocks(self):
+        # Adds the seek points of the blocks of the xz streams, but the first
+        # one of each stream, that starts with the stream.
+        if self.codec != 'xz':
+            return
+        ends = [c for _, c in self.points[1:]] + [self._identity[0]]
+        points = []
+        for (u, start), end in zip(self.points, ends):
+            points.append((u, start))
+            end, blocks = self._read_xz_index(start, end)
+            for idx, (c, _, size) in enumerate(blocks):
+                if idx:
+                    points.append((u, c))
+                    self._blocks[c] = (start, end, blocks, idx)
+                u += size
+        self.points = points
+
+    def _read_xz_index(self, start, end):
+        # Returns the end of the xz stream from ``start`` (before ``end``) and
+        # its blocks (compressed offset, unpadded size, decompressed size),
+        # found in its index. No blocks are returned if the index is invalid.
+        while start + 24 <= end and os.pread(self._fd, 4, end - 4) == bytes(4):
+            end -= 4
+        if end < start + 24:
+            return end, []
+        footer = os.pread(self._fd, 12, end - 12)
+        crc = _struct.unpack('<I', footer[:4])[0]
+        if footer[10:] != b'YZ' or crc != zlib.crc32(footer[4:10]):
+            return end, []
+        size = (_struct.unpack('<I', footer[4:8])[0] + 1) * 4
+        if end - 12 - size < start + 12:
+            return end, []
+        index = os.pread(self._fd, size, end - 12 - size)
+        if (len(index) != size or index[0] != 0 or
+                _struct.unpack('<I', index[-4:])[0] != zlib.crc32(index[:-4])):
+            return end, []
+        values, value, shift = [], 0, 0
+        for byte in index[1:-4]:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                values.append(value)
+                value, shift = 0, 0
+        count = values[0] if values else 0
+        values = values[1:1 + 2 * count]
+        if len(values) != 2 * count:
+            return end, []
+        blocks, c = [], start + 12
+        for unpadded, size in zip(values[::2], values[1::2]):
+            blocks.append((c, unpadded, size))
+            c += (unpadded + 3) // 4 * 4
+        if c != end - 12 - len(index):
+            return end, []
+        return end, blocks
+
+    def _load(self, idx):
+        start = idx * self.page_size
+        if len(self) <= start:
+            return b''
+        # Restart from the closest point before the page.
+        point = bisect.bisect_right(self.points, (start, sys.maxsize)) - 1
+        u, c = self.points[point]
+        if c in self._blocks:
+            first, end, blocks, block = self._blocks[c]
+            header = os.pread(self._fd, 12, first)
+            dec = _XzBlocks(header, blocks[block:], end)
+        else:
+            dec = self._decompressor()
+        state = [dec, c, u, bytearray()]
+        bucket = start // self.step
+        while 0 <= bucket and u < bucket * self.step + self.step:
+            snapshot = self._snapshots.get(bucket)
+            if snapshot is not None and u < snapshot[0] <= start:
+                pos, cpos, dec = snapshot
+                state = [dec.copy(), cpos, pos, bytearray()]
+                break
+            bucket -= 1
+        cur = self._state
+        if (cur is not None and cur[2] <= start and
+                state[2] < cur[2] + len(cur[3])):
+            state = cur
+        self._state = state
+        while idx not in self._pages and self._advance(state, idx):
+            pass
+        return self._pages.get(idx, b'')
+
+    def _advance(self, state, first):
+        # Decompresses a block of the file and stores the pages from ``first``
+        # (None while building the index). Returns False at the end.
+        dec, cpos, base, out = state
+        raw = os.pread(self._fd, self.BLOCK_SIZE, cpos)
+        cpos, more = cpos + len(raw), bool(raw)
+        while raw:
+            if dec.eof:
+                if self.codec == 'xz':
+                    # Streams may be followed by padding.
+                    raw = raw.lstrip(b'\0')
+                if len(raw) < 6 and cpos < self._identity[0]:
+                    # The header of the next member is in the next block.
+                    cpos -= len(raw)
+                    break
+                if self.detect(raw) is None:
+                    # Trailing garbage.
+                    more = False
+                    break
+                dec = self._decompressor()
+                if self._building:
+                    self.points.append((base + len(out), cpos - len(raw)))
+            out += dec.decompress(raw)
+            raw = dec.unused_data if dec.eof else b''
+        pos = base + len(out)
+        bucket = pos // self.step
+        if (self.codec == 'gzip' and not dec.eof and
+                bucket not in self._snapshots):
+            self._snapshots[bucket] = (pos, cpos, dec.copy())
+        ps = self.page_size
+        while out and ((base // ps + 1) * ps <= base + len(out) or not more):
+            size = min((base // ps + 1) * ps - base, len(out))
+            idx = base // ps
+            if (first is not None and base % ps == 0 and
+                    first <= idx < first + max(self.max_pages // 2, 1)):
+                self._store(idx, bytes(out[:size]))
+            del out[:size]
+            base += size
+        state[:] = [dec, cpos, base, out]
+        return more
+
+    def _load_index(self):
+        if self.index is None:
+            return False
+        try:
+            with open(self.index, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return False
+        if len(raw) < self._HEADER.size:
+            return False
+        header = self._HEADER.unpack_from(raw)
+        magic, version, count, csize, mtime_ns, length = header
+        if (magic, version) != (self._MAGIC, self._VERSION):
+            return False
+        if (csize, mtime_ns) != self._identity:
+            return False
+        points = array.array('Q')
+        if len(raw) != self._HEADER.size + 2 * count * points.itemsize:
+            return False
+        points.frombytes(raw[self._HEADER.size:])
+        if sys.byteorder != 'little':
+            points.byteswap()
+        self.points = list(zip(points[::2], points[1::2]))
+        self._size = length
+        return True
+
+    def _save_index(self):
+        if self.index is None:
+            return
+        points = array.array('Q', [it for pt in self.points for it in pt])
+        if sys.byteorder != 'little':
+            points.byteswap()
+        csize, mtime_ns = self._identity
+        header = self._HEADER.pack(self._MAGIC, self._VERSION,
+                                   len(self.points), csize, mtime_ns,
+                                   len(self))
+        tmp = self.index + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.write(points.tobytes())
+        os.replace(tmp, self.index)
+
+
+def index_path(filename):
+    '''Returns the path of the sidecar index of the compressed ``filename``.'''
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    return os.path.join(dirname, '.{}.srddl-index'.format(basename))
+
+
+class _XzBlocks:
+    '''
+    Decompressor of the blocks of a xz stream from one of them (see
+    :class:`CompressedData`): each block is decompressed as a stream of its
+    own, between the header of the stream and an index of the block.
+    '''
+
+    def __init__(self, header, blocks, end):
+        self.header, self.blocks = header, collections.deque(blocks)
+        self.pos, self.end = blocks[0][0], end
+        self.eof, self.unused_data = False, b''
+        self._dec, self._stop, self._tail = None, None, None
+
+    def decompress(self, raw):
+        res = []
+        while not self.eof:
+            if self._dec is None:
+                # Skips to the next block, or the end of the stream.
+                start = self.blocks[0][0] if self.blocks else self.end
+                size = min(start - self.pos, len(raw))
+                raw, self.pos = raw[size:], self.pos + size
+                if self.pos < start:
+                    break
+                if not self.blocks:
+                    self.eof, self.unused_data = True, raw
+                    break
+                _, unpadded, size = self.blocks.popleft()
+                self._dec = lzma.LZMADecompressor()
+                self._dec.decompress(self.header)
+                self._stop = start + (unpadded + 3) // 4 * 4
+                self._tail = _xz_tail(self.header[6:8], unpadded, size)
+            if not raw:
+                break
+            size = min(self._stop - self.pos, len(raw))
+            res.append(self._dec.decompress(raw[:size]))
+            raw, self.pos = raw[size:], self.pos + size
+            if self.pos == self._stop:
+                res.append(self._dec.decompress(self._tail))
+                self._dec = None
+        return b''.join(res)
+
+
+def _xz_tail(flags, unpadded, size):
+    # Returns the index and footer of a xz stream of one block.
+    index = bytearray(b'\0\1')
+    for value in [unpadded, size]:
+        while 0x80 <= value:
+            index.append(value & 0x7f | 0x80)
+            value >>= 7
+        index.append(value)
+    index += bytes(-len(index) % 4)
+    index += _struct.pack('<I', zlib.crc32(index))
+    footer = _struct.pack('<I', len(index) // 4 - 1) + flags
+    footer = _struct.pack('<I', zlib.crc32(footer)) + footer + b'YZ'
+    return bytes(index) + footer
+
+
+class _Piece:
+    '''Node of the tree of pieces of :class:`PieceTableData`.'''
+
+    __slots__ = ('buf', 'start', 'length', 'prio', 'left', 'right', 'total')
+
+    def __init__(self, buf, start, length):
+        self.buf, self.start, self.length = buf, start, length
+        self.prio, self.left, self.right = random.random(), None, None
+        self.total = length
+
+    def update(self):
+        self.total = self.length + _total(self.left) + _total(self.right)
+        return self
+
+
+def _total(node):
+    return 0 if node is None else node.total
+
+
+def _split(node, pos):
+    # Splits the tree in the pieces of the first ``pos`` bytes, and the others.
+    if node is None:
+        return None, None
+    left = _total(node.left)
+    if pos <= left:
+        res, node.left = _split(node.left, pos)
+        return res, node.update()
+    pos -= left
+    if pos < node.length:
+        tail = _Piece(node.buf, node.start + pos, node.length - pos)
+        node.length, right, node.right = pos, node.right, None
+        return node.update(), _merge(tail, right)
+    node.right, res = _split(node.right, pos - node.length)
+    return node.update(), res
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return right if left is None else left
+    if right.prio < left.prio:
+        left.right = _merge(left.right, right)
+        return left.update()
+    right.left = _merge(left, right.left)
+    return right.update()
+
+
+def _find(node, pos):
+    # Returns the piece with the byte at ``pos``, and the position in it.
+    while node is not None:
+        left = _total(node.left)
+        if pos < left:
+            node = node.left
+        elif pos < left + node.length:
+            return node, pos - left
+        else:
+            pos, node = pos - left - node.length, node.right
+    return None, 0
+
+
+def _collect(node, lo, hi, res):
+    # Appends the bytes from ``lo`` to ``hi`` of the pieces of the tree.
+    while node is not None and lo < hi:
+        left = _total(node.left)
+        if lo < left:
+            _collect(node.left, lo, min(hi, left), res)
+        start, end = max(lo - left, 0), min(hi - left, node.length)
+        if start < end:
+            res.append(node.buf[node.start + start:node.start + end])
+        lo, hi = lo - left - node.length, hi - left - node.length
+        node = node.right
+
+
+def _pieces(node):
+    # Yields the pieces of the tree in order.
+    stack = []
+    while stack or node is not None:
+        if node is not None:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            yield node
+            node = node.right
+
+
+def _map_file(filename):
+    with open(filename, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
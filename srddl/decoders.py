@@ -0,0 +1,285 @@
+# srddl/decoders.py - Source-generated decoders for structures.
+# Author: Franck Michea <franck.michea@gmail.com>
+# License: New BSD License (See LICENSE)
+
+'''
+Decoders are an opt-in alternative to the mapping of structures. The decoder
+of a structure class is a Python function generated from the fields of the
+class, that decodes the data at an offset into a :class:`Record` in
+straight-line code: its attributes are the values of the fields (what
+``field['value']`` returns on a mapped structure), sub-structures are records
+and arrays are lists.
+
+    decode = decoder(UnknownFile)
+    record = decode(data, 0)
+    print(record.length, record.chunks[0].data)
+
+Each field generates its own code (see
+:meth:`srddl.core.fields.AbstractField.generate_decoder`). References used by
+the fields (sizes, dimensions, switch values) and ``_pre_mapping`` are
+evaluated on the record being decoded. A decoder is generated once per class
+and order of the fields (structures overriding ``_pre_mapping`` may have one
+per order). Classes with fields that can't be generated fall back to the
+mapping of the structure, and so does the decoding of a record when its code
+fails, like a lambda reading ``field['value']`` on the record: the mapping
+then decodes the record, or raises the error.
+'''
+
+import contextlib
+import operator
+import struct
+
+import srddl.core.helpers as sch
+import srddl.fields as sf
+import srddl.models as sm
+
+from srddl.core.fields import AbstractField, BoundValue
+
+_RECORDS = dict()
+_DECODERS = dict()
+
+
+class Record:
+    '''
+    Base class of the records returned by decoders. Each structure class gets
+    its own record class, with one slot per field. ``_offset`` and ``_size``
+    are the offset and the size of the record in bytes.
+    '''
+
+    __slots__ = ('_offset', '_size')
+
+    _fields = ()
+
+    def __repr__(self):
+        values = ', '.join('{}={!r}'.format(name, getattr(self, name, None))
+                           for name in self._fields)
+        return '<{} at {:#x}: {}>'.format(
+            self.__class__.__name__, self._offset, values
+        )
+
+    def _asdict(self):
+        return dict((name, getattr(self, name)) for name in self._fields)
+
+
+def record_class(klass):
+    '''Returns the record class of the structure class ``klass``.'''
+    res = _RECORDS.get(klass)
+    if res is None:
+        namespace = {
+            '__slots__': klass._srddl_order,
+            '_fields': klass._srddl_order,
+            '__module__': klass.__module__,
+        }
+        res = type('{}Record'.format(klass.__name__), (Record,), namespace)
+        _RECORDS[klass] = res
+    return res
+
+
+def decoder(klass):
+    '''
+    Returns the decoder of the structure class ``klass``: a function taking
+    the data and an offset, and returning a record.
+    '''
+    res = _DECODERS.get(klass)
+    if res is None:
+        if klass._pre_mapping is sm.Struct._pre_mapping:
+            res = _variant(klass, klass._srddl_order)
+        else:
+            res = _dispatcher(klass)
+        _DECODERS[klass] = res
+    return res
+
+
+def decode(data, offset, klass):
+    '''Decodes the structure ``klass`` at ``offset`` of ``data``.'''
+    return decoder(klass)(data, offset)
+
+
+def _dispatcher(klass):
+    # The order of the fields depends on the data, so the decoder of the order
+    # is fetched for every record.
+    record, fallback = record_class(klass), _fallback(klass)
+
+    def decode(data, offset, rec=None):
+        if rec is None:
+            rec = record()
+        try:
+            order = sm.mapping_order(klass, rec, data)
+        except Exception:
+            # _pre_mapping may only work on the structure.
+            return fallback(data, offset, rec)
+        variant = _DECODERS.get((klass, order))
+        if variant is None:
+            variant = _DECODERS[(klass, order)] = _variant(klass, order)
+        return variant(data, offset, rec)
+    return decode
+
+
+def _variant(klass, order):
+    gen = _Generator(klass, order)
+    try:
+        return gen.compile()
+    except _Unsupported:
+        return _fallback(klass)
+
+
+def _fallback(klass):
+    def decode(data, offset, rec=None):
+        return _to_record(klass(data, offset), rec)
+    return decode
+
+
+def _to_record(struct, rec=None):
+    if rec is None:
+        rec = record_class(type(struct))()
+    rec._offset, rec._size = struct['offset'].byte, struct['size'].rounded()
+    for field_name in struct['fields']:
+        setattr(rec, field_name, _record_value(getattr(struct, field_name)))
+    return rec
+
+
+def _record_value(value):
+    if isinstance(value, sf.ArrayFieldBoundValue):
+        return [_record_value(it) for it in value]
+    if isinstance(value, BoundValue):
+        value = value['value']
+    if isinstance(value, sm.Struct):
+        return _to_record(value)
+    return value
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Generator:
+    '''
+    Generates the source of the decoder of a structure class for an order of
+    its fields. Consecutive fields with a static format are unpacked with a
+    single :class:`struct.Struct`.
+    '''
+
+    def __init__(self, klass, order):
+        self.klass, self.order, self.done = klass, order, set()
+        self.namespace = {
+            '_index': operator.index,
+            '_Record': record_class(klass),
+            '_fallback': _fallback(klass),
+        }
+        # The code of the fields is in a try block of the decoder.
+        self.lines, self.indent, self.tmp = [], 2, 0
+        self.static, self.endianess = [], None
+
+    def compile(self):
+        for field_name in self.order:
+            idx = self.klass._srddl_names[field_name]
+            field = self.klass._srddl_fields[idx]
+            if not field.generate_decoder(self, 'rec.' + field_name):
+                raise _Unsupported()
+            self.done.add(field_name)
+        self.flush()
+        lines = [
+            'def decode(data, offset, rec=None):',
+            '    if rec is None:',
+            '        rec = _Record()',
+            '    unpack = data.unpack_from',
+            '    offset = pos = _index(offset)',
+            '    try:',
+        ] + (self.lines or ['        pass']) + [
+            '    except Exception:',
+            '        return _fallback(data, offset, rec)',
+            '    rec._offset, rec._size = offset, pos - offset',
+            '    return rec',
+        ]
+        source = '\n'.join(lines) + '\n'
+        filename = '<srddl decoder of {}>'.format(self.klass.__qualname__)
+        exec(compile(source, filename, 'exec'), self.namespace)
+        res = self.namespace['decode']
+        res._source = source
+        return res
+
+    def const(self, obj):
+        '''Returns the name of a constant of the decoder holding ``obj``.'''
+        name = '_c{}'.format(len(self.namespace))
+        self.namespace[name] = obj
+        return name
+
+    def var(self):
+        '''Returns the name of a new local variable.'''
+        self.tmp += 1
+        return '_v{}'.format(self.tmp)
+
+    def emit(self, line):
+        '''Appends a line of code, after the fields waiting to be unpacked.'''
+        self.flush()
+        self.lines.append('    ' * self.indent + line)
+
+    @contextlib.contextmanager
+    def block(self, line):
+        '''Emits ``line`` and indents the code generated in the context.'''
+        self.emit(line)
+        self.indent += 1
+        yield
+        self.flush()
+        self.indent -= 1
+
+    def ref(self, ref):
+        '''
+        Returns an expression evaluating to the value of the reference ``ref``
+        (see :func:`srddl.core.helpers.reference_value`).
+        '''
+        if isinstance(ref, int):
+            return repr(ref)
+        if isinstance(ref, AbstractField):
+            idx = self.klass._srddl_indices.get(ref)
+            if idx is None or self.klass._srddl_order[idx] not in self.done:
+                raise _Unsupported()
+            return 'rec.' + self.klass._srddl_order[idx]
+        if callable(ref):
+            return '_index({}(rec))'.format(self.const(ref))
+        raise _Unsupported()
+
+    def unpack(self, target, frmt, convert=None):
+        '''
+        Unpacks the value described by the static format ``frmt`` into
+        ``target``, with the following fields. ``convert`` is called with the
+        record and the unpacked value.
+        '''
+        endianess = None
+        if frmt[:1] in ['<', '>', '!']:
+            endianess, frmt = frmt[0].replace('!', '>'), frmt[1:]
+            if sch.format_size(frmt) == 1:
+                endianess = None
+        if endianess is not None:
+            if self.endianess not in [None, endianess]:
+                self.flush()
+            self.endianess = endianess
+        self.static.append((target, frmt, convert))
+
+    def flush(self):
+        '''Unpacks the fields waiting to be unpacked.'''
+        if not self.static:
+            return
+        static, self.static = self.static, []
+        frmt = (self.endianess or '<') + ''.join(f for _, f, _ in static)
+        self.endianess, compiled = None, struct.Struct(frmt)
+        targets, converts, nones = [], [], []
+        for target, f, convert in static:
+            if not sch.format_count(f):
+                nones.append(target)
+                continue
+            targets.append(target)
+            if convert is not None:
+                converts.append((target, convert))
+        lines = []
+        if targets:
+            lines.append('{}, = unpack({}, pos)'.format(', '.join(targets),
+                                                        self.const(compiled)))
+        for target, convert in converts:
+            convert = self.const(convert)
+            lines.append('{0} = {1}(rec, {0})'.format(target, convert))
+        if nones:
+            lines.append('{} = None'.format(' = '.join(nones)))
+        lines.append('pos += {}'.format(compiled.size))
+        for line in lines:
+            self.lines.append('    ' * self.indent + line)
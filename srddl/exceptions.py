@@ -21,6 +21,15 @@ class ArrayError(Exception):
         return 'The array content must be a field.'
 
 
+class NotAStructArrayError(Exception):
+    def __init__(self, field):
+        self._field = field
+
+    def __str__(self):
+        res = 'The array {!r} is not an array of structures.'
+        return res.format(self._field)
+
+
 class ROContainerError(Exception):
     def __str__(self):
         res = 'Containers are read-only, you can set their content but not'
@@ -195,3 +204,41 @@ class DataIsROError(Exception):
         res = 'Data {data} is read-only, can\'t set its content at offset'
         res += ' {offset}.'
         return res.format(data=self.data, offset=self.offset)
+
+
+class NoFilenameError(Exception):
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        res = 'Data {data} has no file, a file name is needed to save it.'
+        return res.format(data=self.data)
+
+
+class InvalidIndexError(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __str__(self):
+        res = 'The serialized index is invalid: {reason}.'
+        return res.format(reason=self.reason)
+
+
+class PageEvictedError(Exception):
+    def __init__(self, data, offset):
+        self.data, self.offset = data, offset
+
+    def __str__(self):
+        res = 'Data {data} is a stream, the bytes at offset {offset} were'
+        res += ' dropped from its cache and can\'t be read again.'
+        return res.format(data=self.data, offset=self.offset)
+
+
+class UnknownCompressionError(Exception):
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __str__(self):
+        res = 'File {filename} is not compressed with a supported format'
+        res += ' (gzip, bzip2 or xz).'
+        return res.format(filename=self.filename)
@@ -2,7 +2,9 @@
 # Author: Franck Michea <franck.michea@gmail.com>
 # License: New BSD License (See LICENSE)
 
+import collections.abc
 import copy
+import struct
 
 from itertools import islice
 
@@ -42,12 +44,161 @@ class SuperField(AbstractContainerField):
         super().__init__(*args, **kwargs)
 
     def decode(self, instance, offset):
-        return self._cls(instance['data'], offset)
+        res = self._cls(instance['data'], offset)
+        # Writes in the sub-structure are propagated to the structure.
+        res._srddl.parent = (instance, self)
+        return res
+
+    def references(self):
+        return []
+
+    def static_format(self):
+        layout = self._cls._srddl_layout
+        return None if layout is None else '{}x'.format(layout.size)
+
+    def static_size(self):
+        return self._cls.static_size()
+
+    def generate_decoder(self, gen, target):
+        import srddl.decoders as sdec
+        decoder = gen.const(sdec.decoder(self._cls))
+        gen.emit('{} = {}(data, pos)'.format(target, decoder))
+        gen.emit('pos += {}._size'.format(target))
+        return True
 
     def _display_value(self, flags, value):
         return value[flags['_nd_attrname']]
 
 
+class StaticArray(collections.abc.Sequence):
+    '''
+    Elements of an array of elements with a static size (see
+    :meth:`srddl.core.fields.AbstractField.static_size`). The offset of an
+    element is computed from its index, and its field is only created when
+    the element is accessed, so accessing an element takes the same time
+    whatever the size of the array.
+    '''
+
+    def __init__(self, instance, desc, offset, dim, elem_size):
+        self._instance, self._desc, self._offset = instance, desc, offset
+        self._dim, self._elem_bits, self._fields = dim, elem_size._bits, dict()
+
+    def __len__(self):
+        return self._dim
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[it] for it in range(*idx.indices(self._dim))]
+        if idx < 0:
+            idx += self._dim
+        if not 0 <= idx < self._dim:
+            raise IndexError(idx)
+        field = self._fields.get(idx)
+        if field is None:
+            field = self._fields[idx] = copy.copy(self._desc)
+            self._initialize(field, idx, self.offset(idx))
+        return field
+
+    def offset(self, idx):
+        '''Returns the offset of the element at index ``idx``.'''
+        return self._offset + sco.Size._from_bits(idx * self._elem_bits)
+
+    @property
+    def size(self):
+        return sco.Size._from_bits(self._dim * self._elem_bits)
+
+    def _initialize(self, field, idx, offset):
+        field.initialize(self._instance, offset)
+
+
+class PackedArray(StaticArray):
+    '''
+    Elements of an array of fixed-size elements (integers, byte arrays or
+    structures with a static layout), decoded at once. The elements are only
+    unpacked when the array is first iterated: ``values`` then holds the
+    values of all elements, as a NumPy array when NumPy is available (a
+    structured array for structures), or as a tuple (a list of tuples for
+    structures) unpacked with :mod:`struct`. Until then, an element accessed
+    by index is unpacked alone. Like the elements decoded one by one, the
+    array raises :class:`struct.error` when it doesn't fit in the data.
+    '''
+
+    def __init__(self, instance, desc, offset, dim, frmt):
+        self.elem_size = sch.format_size(frmt.lstrip('<>!'))
+        super().__init__(instance, desc, offset, dim, sco.Size(self.elem_size))
+        end = offset.byte + dim * self.elem_size
+        if len(instance['data']) < end:
+            msg = 'unpack_from requires a buffer of at least {} bytes'
+            raise struct.error(msg.format(end))
+        # Elements with a single value are unpacked with the array.
+        self._frmt, self._values = frmt, None
+        self._single = sch.format_count(frmt) == 1
+
+    def __iter__(self):
+        if self._single:
+            self.values
+        return super().__iter__()
+
+    def _initialize(self, field, idx, offset):
+        value = None
+        if self._single:
+            if self._values is None:
+                frmt = self._frmt
+                if frmt[:1] not in ['<', '>', '!']:
+                    frmt = '<' + frmt
+                data = self._instance['data']
+                value = data.unpack_from(frmt, offset.byte)[0]
+            else:
+                value = self._values[idx]
+                value = value.item() if hasattr(value, 'item') else value
+        field.initialize_unpacked(self._instance, offset, value)
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = self._unpack()
+        return self._values
+
+    def _unpack(self):
+        data, size = self._instance['data'], self._dim * self.elem_size
+        raw = data.unpack_from('{}s'.format(size), self._offset.byte)[0]
+        dtype, layout = self._dtype(), None
+        if isinstance(self._desc, SuperField):
+            layout = self._desc._cls._srddl_layout
+        if dtype is not None:
+            return sch.numpy.frombuffer(raw, dtype=dtype, count=self._dim)
+        if layout is not None:
+            return list(layout.struct.iter_unpack(raw))
+        endianess, frmt = '<', self._frmt
+        if frmt[:1] in ['<', '>', '!']:
+            endianess, frmt = frmt[0], frmt[1:]
+        if len(frmt) == 1:
+            frmt = '{}{}{}'.format(endianess, self._dim, frmt)
+            return struct.unpack(frmt, raw)
+        return tuple(it[0] for it in struct.iter_unpack(endianess + frmt, raw))
+
+    def _dtype(self):
+        if not sch.NUMPY_ON:
+            return None
+        if not isinstance(self._desc, SuperField):
+            dtype = sch.format_dtype(self._frmt)
+            # Strings are left to struct: NumPy strips their trailing zeros.
+            return dtype if dtype is not None and dtype[0] != 'S' else None
+        layout = self._desc._cls._srddl_layout
+        names, formats, offsets = [], [], []
+        for field_name, field, offset, idx in layout.fields:
+            if idx is None:
+                continue
+            dtype = sch.format_dtype(field.static_format(), layout.endianess)
+            if dtype is None:
+                return None
+            names.append(field_name)
+            formats.append(dtype)
+            offsets.append(offset.byte)
+        return sch.numpy.dtype({'names': names, 'formats': formats,
+                                'offsets': offsets, 'itemsize': layout.size})
+
+
 class ArrayFieldBoundValue(scf.BoundValue):
     def __len__(self):
         return len(self['value'])
@@ -75,7 +226,26 @@ class ArrayFieldBoundValue(scf.BoundValue):
         for it in self['value']:
             yield it.__get__(self._instance)
 
+    def columns(self):
+        '''
+        Exports the structures of an array of structures as columns, one per
+        field (see :mod:`srddl.columns`).
+        '''
+        import srddl.columns as scol
+        desc = self._field._desc
+        if not isinstance(desc, SuperField):
+            raise se.NotAStructArrayError(self._field)
+        value, data = self['value'], self._instance['data']
+        if isinstance(value, PackedArray):
+            offsets = [value._offset.byte + it * value.elem_size
+                       for it in range(len(value))]
+            return scol.columns(data, desc._cls, offsets)
+        structs = [it['value'] for it in self]
+        return scol.columns(data, desc._cls, structs)
+
     def _size(self, flags):
+        if isinstance(self['value'], StaticArray):
+            return self['value'].size
         res = sco.Size()
         for it in self['value']:
             res += it.__get__(self._instance)['size']
@@ -91,6 +261,14 @@ class ArrayField(AbstractContainerField):
 
     def decode(self, instance, offset):
         data, dim = [], sch.reference_value(instance, self._dim)
+        frmt = self._desc.static_format()
+        if frmt is not None and offset.aligned():
+            # Elements have a fixed size, so they are decoded at once.
+            return PackedArray(instance, self._desc, offset, dim, frmt)
+        size = self._desc.static_size()
+        if size is not None:
+            # Elements have a fixed size, so they are initialized on access.
+            return StaticArray(instance, self._desc, offset, dim, size)
         for _ in range(dim):
             desc = copy.copy(self._desc)
             desc.initialize(instance, offset)
@@ -98,6 +276,47 @@ class ArrayField(AbstractContainerField):
             offset += desc.__get__(instance)['size']
         return data
 
+    def static_format(self):
+        if not isinstance(self._dim, int):
+            return None
+        frmt = self._desc.static_format()
+        if frmt is None:
+            return None
+        return '{}x'.format(self._dim * sch.format_size(frmt))
+
+    def references(self):
+        return [self._dim] + self._desc.references()
+
+    def static_size(self):
+        size = self._desc.static_size()
+        if not isinstance(self._dim, int) or size is None:
+            return None
+        return sco.Size._from_bits(self._dim * size._bits)
+
+    def generate_decoder(self, gen, target):
+        dim, frmt = gen.ref(self._dim), self._desc.static_format()
+        generate = type(self._desc).generate_decoder
+        if frmt is not None and generate is scf.AbstractField.generate_decoder:
+            # Elements with a static format are unpacked at once.
+            endianess, frmt = frmt[:1], frmt[1:]
+            if endianess not in ['<', '>', '!']:
+                endianess, frmt = '<', endianess + frmt
+            count, size = gen.var(), sch.format_size(frmt)
+            gen.emit('{} = {}'.format(count, dim))
+            gen.emit("{} = list(unpack('{}' + {!r} * {}, pos))".format(
+                target, endianess, frmt, count
+            ))
+            gen.emit('pos += {} * {}'.format(size, count))
+            return True
+        res, elem = gen.var(), gen.var()
+        gen.emit('{} = []'.format(res))
+        with gen.block('for _ in range({}):'.format(dim)):
+            if not self._desc.generate_decoder(gen, elem):
+                return False
+            gen.emit('{}.append({})'.format(res, elem))
+        gen.emit('{} = {}'.format(target, res))
+        return True
+
     class Meta:
         boundvalue_class = ArrayFieldBoundValue
 
@@ -50,7 +50,15 @@ class IntField(scf.AbstractField):
     def decode(self, instance, offset):
         size = self.__get__(instance)['size']
         res = instance['data'].unpack_from(self._sig(size), offset.byte)[0]
-        return self._values.get(res, res)
+        return self.from_unpacked(instance, res)
+
+    def static_format(self):
+        if not isinstance(self._size, int):
+            return None
+        return self._sig(sco.Size(byte=self._size))
+
+    def from_unpacked(self, instance, value):
+        return self._values.get(value, value)
 
     def encode(self, instance, offset, value):
         size = self.__get__(instance)['size']
@@ -75,17 +83,48 @@ class ByteArrayField(scf.AbstractField):
         self._size = size
 
     def decode(self, instance, offset):
-        size = self.__get__(instance)['size']
-        return instance['data'].unpack_from(self._sig(size), offset.byte)[0]
+        size, data = self.__get__(instance)['size'], instance['data']
+        if data.zero_copy:
+            return data.slice_from(offset.byte, size.byte)
+        return data.unpack_from(self._sig(size), offset.byte)[0]
+
+    def initialize_unpacked(self, instance, offset, value, path=None):
+        if instance['data'].zero_copy:
+            # The value is decoded as a view of the data when read.
+            value = None
+        super().initialize_unpacked(instance, offset, value, path=path)
 
     def encode(self, instance, offset, value):
         size = self.__get__(instance)['size']
         value = value.ljust(size.byte, '\x00')[:size.byte]
         instance['data'].pack_into(self._sig(size), offset.byte, value)
 
+    def static_format(self):
+        if not isinstance(self._size, int):
+            return None
+        return self._sig(sco.Size(byte=self._size))
+
+    def generate_decoder(self, gen, target):
+        if isinstance(self._size, int):
+            return super().generate_decoder(gen, target)
+        size = gen.var()
+        gen.emit('{} = {}'.format(size, gen.ref(self._size)))
+        with gen.block('if data.zero_copy:'):
+            gen.emit('{} = data.slice_from(pos, {})'.format(target, size))
+        with gen.block('else:'):
+            gen.emit("{}, = unpack('%ds' % {}, pos)".format(target, size))
+        gen.emit('pos += {}'.format(size))
+        return True
+
     def _sig(self, size):
         return '{}s'.format(size.byte)
 
+    def _display_value(self, flags, value):
+        if isinstance(value, memoryview):
+            # Zero-copy values are displayed like copied values.
+            return str(bytes(value))
+        return None
+
 
 class BitFieldBoundValue(IntFieldBoundValue):
     def _size(self, flags):
@@ -104,6 +143,11 @@ class BitField(scf.AbstractField):
         super().__init__(*args, **kwargs)
         self._size = size
 
+    def static_size(self):
+        if not isinstance(self._size, int):
+            return None
+        return sco.Size(bit=self._size)
+
     def decode(self, instance, offset):
         size = self.__get__(instance)['size']
         log2 = {1: 0, 2: 1, 4: 2, 8: 3}
@@ -129,8 +173,8 @@ class BitField(scf.AbstractField):
 class BitMaskField(IntField):
     class Meta: pass
 
-    def decode(self, instance, offset):
-        nb = super().decode(instance, offset)
+    def from_unpacked(self, instance, value):
+        nb = super().from_unpacked(instance, value)
         if isinstance(nb, scf.Value):
             return [nb]
         res, mask = [], 0
@@ -142,6 +186,13 @@ class BitMaskField(IntField):
             res.append(nb ^ mask)
         return (res if res else [nb])
 
+    def generate_decoder(self, gen, target):
+        frmt = self.static_format()
+        if frmt is None:
+            return False
+        gen.unpack(target, frmt, convert=self.from_unpacked)
+        return True
+
     def _display_value(self, flags, vals):
         res = []
         for val in vals:
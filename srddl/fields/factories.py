@@ -28,6 +28,12 @@ class SwitchField(FieldFactory):
     def __init__(self, val, mapping):
         self.val, self.mapping = val, mapping
 
+    def references(self):
+        res = [self.val]
+        for field in self.mapping.values():
+            res.extend(field.references())
+        return res
+
     def pre_initialize(self, instance):
         val = sch.reference_value(instance, self.val)
         if val in self.mapping:
@@ -36,3 +42,24 @@ class SwitchField(FieldFactory):
             return self.mapping[SwitchField.DEFAULT]
         else:
             raise se.SwitchFieldError(self, val)
+
+    def generate_decoder(self, gen, target):
+        val, default = gen.var(), self.mapping.get(SwitchField.DEFAULT)
+        gen.emit('{} = {}'.format(val, gen.ref(self.val)))
+        keyword = 'if'
+        for key, field in self.mapping.items():
+            if key is SwitchField.DEFAULT:
+                continue
+            test = '{} {} == {}:'.format(keyword, val, gen.const(key))
+            with gen.block(test):
+                if not field.generate_decoder(gen, target):
+                    return False
+            keyword = 'elif'
+        with gen.block('else:' if keyword == 'elif' else 'if True:'):
+            if default is None:
+                gen.emit('raise {}({}, {})'.format(
+                    gen.const(se.SwitchFieldError), gen.const(self), val
+                ))
+            elif not default.generate_decoder(gen, target):
+                return False
+        return True
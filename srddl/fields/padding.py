@@ -28,5 +28,24 @@ class PaddingField(scf.AbstractField):
     def decode(self, data, offset):
         return None
 
+    def static_format(self):
+        if self._mode != PaddingField.Mode.TAKE:
+            return None
+        if not isinstance(self._size, int):
+            return None
+        return '{}x'.format(self._size)
+
+    def generate_decoder(self, gen, target):
+        if self._mode == PaddingField.Mode.FILL:
+            if not isinstance(self._size, int):
+                return False
+            gen.emit('pos = max(pos, {})'.format(self._size))
+        elif isinstance(self._size, int):
+            return super().generate_decoder(gen, target)
+        else:
+            gen.emit('pos += {}'.format(gen.ref(self._size)))
+        gen.emit('{} = None'.format(target))
+        return True
+
     def encode(self, data, offset, value):
         pass
@@ -1,24 +1,26 @@
 # All values were found in /usr/bin/elf.h of my GNU/Linux distribution.
 
 import sys
-import functools
 
-import srddl.exceptions as se
 import srddl.fields as sf
 import srddl.helpers as sh
 import srddl.models as sm
 
 
 # Atomic types.
+def _word_size(field, struct):
+    # The size only depends on the class of the file, but it is cached with
+    # the data of the field to avoid looking the header up every time.
+    res = field._get_data(struct, 'size', None)
+    if res is None:
+        header = struct['data'].mapped.lookup(0, struct)
+        res = header.e_indent.ei_class['value'] * 4
+        field._set_data(struct, 'size', res)
+    return res
+
 class IntFieldN(sf.IntField):
-    @functools.lru_cache()
     def _size(self, struct):
-        try:
-            header = struct['data'].mapped[0]
-        except:
-            header = struct
-        res = header.e_indent.ei_class['value'] * 4
-        return res
+        return _word_size(self, struct)
 
 class ElfN_Off(IntFieldN):
     def __init__(self, *args, **kwargs):
@@ -28,14 +30,8 @@ class ElfN_Off(IntFieldN):
 class ElfN_Addr(ElfN_Off): pass
 
 class BitMaskFieldN(sf.BitMaskField):
-    @functools.lru_cache()
     def _size(self, struct):
-        try:
-            header = struct['data'].mapped[0]
-        except se.NoMappedDataError:
-            header = struct
-        res = header.e_indent.ei_class['value'] * 4
-        return res
+        return _word_size(self, struct)
 
 # Structures
 EI_INDENT = 16
@@ -3,8 +3,8 @@
 
 import abc
 import collections
-import functools
 import inspect
+import struct
 
 import srddl.core.exceptions as sce
 import srddl.core.helpers as sch
@@ -13,45 +13,235 @@ import srddl.exceptions as se
 
 import srddl.core.nameddict as scnd
 
-from srddl.core.fields import AbstractMappedValue, AbstractField, FieldInitStatus
+from srddl.core.fields import AbstractMappedValue, AbstractField, FieldState
 from srddl.core.offset import Offset, Size
 
+def mapping_order(klass, instance, data):
+    '''
+    Returns the names of the fields of ``klass`` in the order they are mapped,
+    as modified by its ``_pre_mapping`` method called on ``instance``.
+    '''
+    order = klass._srddl_order
+    if klass._pre_mapping is Struct._pre_mapping:
+        return order
+    lst = list(order)
+    for key, new in klass._pre_mapping(instance, data, lst):
+        if -1 < new < len(lst):
+            del lst[lst.index(key)]
+            lst.insert(new, key)
+    return tuple(lst)
+
+
 class _SrddlInternal(AbstractMappedValue):
     '''
     This class is used to create one instance per structure and permit srddl
     to add as much fields as it wants without being too intrusive of the
     structure.
+
+    The fields of the structure, their order and their indices are computed
+    once per class by :class:`_MetaStruct`. An instance only keeps a state
+    vector with two entries per field, indexed by the index of the field: its
+    bound value and its decoded value (see
+    :data:`srddl.core.fields.FieldState`).
+
+    Fields are mapped in their order by :meth:`map_fields`. Lazy structures
+    only map a field (and the fields before it) when it is first accessed.
+    When the data of a field is written, the fields depending on it are
+    mapped again by :meth:`changed`.
     '''
 
+    __slots__ = ('instance', 'fields', 'indices', 'state', 'fields_data',
+                 'order', 'mapped', 'next_offset', 'parent')
+
     class Meta(AbstractMappedValue.Meta):
         init_props = ['_', 'data', 'offset']# + AbstractMappedValue.Meta.init_props
 
     def __init__(self, instance, data, offset):
-        self.instance, self._data, self._offset = instance, data, Offset(offset)
-
-        # Some meta data on fields.
-        self.fields_data = dict()
+        super().__init__(data, Offset(offset))
+        self.instance, klass = instance, instance.__class__
+
+        # The fields and their indices are shared with the class, until a
+        # field factory replaces one of the fields for this instance.
+        self.fields, self.indices = klass._srddl_fields, klass._srddl_indices
+        self.state = [None] * (2 * len(self.fields))
+
+        # Data of the fields that are not fields of the structure (like the
+        # elements of an array), and other data on fields. It is only created
+        # when needed.
+        self.fields_data = None
+
+        # Number of fields mapped in the order of the fields, and offset where
+        # the next field starts (None until the size of the last field mapped
+        # is needed).
+        self.order, self.mapped, self.next_offset = None, 0, None
+
+        # Structure and field this structure is the value of, if any.
+        self.parent = None
+
+    def field(self, field_name):
+        '''Returns the field named ``field_name`` for this instance.'''
+        return self.fields[self.instance.__class__._srddl_names[field_name]]
+
+    def get_state(self, field, kind):
+        idx = self.indices.get(field)
+        if idx is not None:
+            return self.state[2 * idx + kind]
+        if self.fields_data is None:
+            return None
+        return self.fields_data.get((field, kind))
+
+    def set_state(self, field, kind, value):
+        idx = self.indices.get(field)
+        if idx is not None:
+            self.state[2 * idx + kind] = value
+        else:
+            self.set_data(field, kind, value)
 
-        # The namespace contains all the fields of the structure.
-        self.namespace = collections.OrderedDict()
+    def set_data(self, field, name, value):
+        if self.fields_data is None:
+            self.fields_data = dict()
+        self.fields_data[(field, name)] = value
 
-    def add_namespace(self, namespace):
-        for field_name, field in namespace.items():
-            if isinstance(field, AbstractField):
-                self.namespace[field_name] = field
+    def field_order(self):
+        '''Returns the names of the fields in the order they are mapped.'''
+        if self.order is None:
+            klass = self.instance.__class__
+            self.order = mapping_order(klass, self.instance, self['data'])
+        return self.order
 
     def map_struct(self):
-        cur_offset = Offset()
-        for field_name in self['fields']:
-            field = self.namespace[field_name]
-            while True:
-                field_pi = field.pre_initialize(self.instance)
-                if field_pi is None:
+        klass = self.instance.__class__
+        layout = klass._srddl_layout
+        if layout is not None and self['offset'].aligned():
+            return layout.map_struct(self)
+        if not klass._srddl_lazy:
+            self.map_fields(len(self.fields), sized=True)
+
+    def map_fields(self, count, sized=False):
+        '''
+        Maps the fields of the structure in their order, until ``count`` of
+        them are initialized. The size of a field is only computed when the
+        next field is mapped, or for the last one if ``sized`` is True.
+        '''
+        if self.mapped is None:
+            # Fields after the one being mapped are not ready.
+            return
+        klass, order = self.instance.__class__, self.field_order()
+        mapped, next_offset, self.mapped = self.mapped, self.next_offset, None
+        try:
+            while mapped < count or (sized and next_offset is None):
+                if next_offset is None:
+                    next_offset = self['offset']
+                    if mapped:
+                        previous = self.field(order[mapped - 1])
+                        bv = previous.__get__(self.instance)
+                        next_offset = bv['offset'] + bv['size']
+                if count <= mapped:
                     break
-                field, self.namespace[field_name] = field_pi, field_pi
-            off = self['offset'] + cur_offset
-            field.initialize(self.instance, off, path=field_name)
-            cur_offset += field.__get__(self.instance)['size']
+                idx = klass._srddl_names[order[mapped]]
+                field = self.fields[idx]
+                while True:
+                    field_pi = field.pre_initialize(self.instance)
+                    if field_pi is None:
+                        break
+                    if self.fields is klass._srddl_fields:
+                        self.fields = list(self.fields)
+                        self.indices = dict(self.indices)
+                    self.fields[idx], self.indices[field_pi] = field_pi, idx
+                    field = field_pi
+                field.initialize(self.instance, next_offset,
+                                 path=order[mapped])
+                mapped, next_offset = mapped + 1, None
+        finally:
+            self.mapped, self.next_offset = mapped, next_offset
+
+    def map_field(self, field):
+        '''
+        Maps the fields of a lazy structure until ``field``, and returns True
+        if some fields were mapped.
+        '''
+        idx = self.indices.get(field)
+        if idx is None or self.mapped is None:
+            return False
+        field_name = self.instance.__class__._srddl_order[idx]
+        count = self.field_order().index(field_name) + 1
+        if count <= self.mapped:
+            return False
+        self.map_fields(count)
+        return True
+
+    def sizes(self):
+        '''
+        Returns the sizes of the structure and of the structures holding it
+        (see :meth:`changed`), the outermost one excluded.
+        '''
+        res, srddl = [], self
+        while srddl.parent is not None:
+            res.append(srddl['size'])
+            srddl = srddl.parent[0]._srddl
+        return res
+
+    def changed(self, field, resized=False, sizes=None):
+        '''
+        Called when the data of ``field`` was written (or the data of the
+        sub-structure it holds): the fields depending on it (see
+        :func:`dependencies`) and the fields after them are mapped again, or
+        the fields after ``field`` if its size changed (``resized``). The
+        parent structure is then told that this structure changed, and if it
+        was resized: ``sizes`` are the sizes returned by :meth:`sizes` before
+        the write, since sizes are computed from the data.
+        '''
+        klass, order = self.instance.__class__, self.field_order()
+        direct, dynamic = dependencies(klass)
+        idx, has_parent = self.indices.get(field), self.parent is not None
+        if idx is None:
+            # Elements of arrays are not fields of the structure.
+            affected = set(range(len(self.fields)))
+        else:
+            affected, todo = set(dynamic), list(dynamic) + [idx]
+            while todo:
+                for it in direct.get(todo.pop(), ()):
+                    if it not in affected:
+                        affected.add(it)
+                        todo.append(it)
+        positions = [order.index(klass._srddl_order[it]) for it in affected]
+        if resized and idx is not None:
+            positions.append(order.index(klass._srddl_order[idx]) + 1)
+        if klass._pre_mapping is not Struct._pre_mapping and positions:
+            # The order of the fields may depend on the data.
+            positions, self.order = [0], None
+        start = min(positions) if positions else self.mapped
+        if self.mapped is not None and start < self.mapped:
+            self.remap(start)
+        elif not has_parent:
+            # Mapping in progress, or nothing to map again.
+            return
+        if has_parent:
+            instance, field = self.parent
+            resized = bool(sizes) and sizes[0] != self['size']
+            instance._srddl.changed(field, resized=resized,
+                                    sizes=sizes and sizes[1:])
+        else:
+            self['data'].mapped.resized(self.instance)
+
+    def remap(self, start):
+        '''
+        Forgets the fields mapped from position ``start`` in the order of the
+        fields, and maps them again (when they are accessed for lazy
+        structures).
+        '''
+        klass, order = self.instance.__class__, self.field_order()
+        for field_name in order[start:self.mapped]:
+            idx = klass._srddl_names[field_name]
+            field = self.fields[idx]
+            if field is not klass._srddl_fields[idx]:
+                # Replaced by its factory, which may choose another field.
+                del self.indices[field]
+                self.fields[idx] = klass._srddl_fields[idx]
+            self.state[2 * idx] = self.state[2 * idx + 1] = None
+        self.mapped, self.next_offset = min(self.mapped, start), None
+        if not klass._srddl_lazy:
+            self.map_fields(len(self.fields), sized=True)
 
     def _display_value(self, flags):
         res = '{} [{}, {}] = {{\n'.format(
@@ -65,9 +255,12 @@ class _SrddlInternal(AbstractMappedValue):
         return res
 
     def _size(self, flags):
+        layout = self.instance.__class__._srddl_layout
+        if layout is not None:
+            return Size(layout.size)
         size, prop = Size(), 'size' + (':static' if flags['static'] else '')
         for field_name in self['fields']:
-            field = self.namespace[field_name]
+            field = self.field(field_name)
             try:
                 size += field.__get__(self.instance)[prop]
             except TypeError:
@@ -76,12 +269,7 @@ class _SrddlInternal(AbstractMappedValue):
 
     @scnd.property()
     def _fields(self, flags):
-        lst = list(self.namespace.keys())
-        for key, new in self.instance._pre_mapping(self['data'], lst):
-            if -1 < new < len(lst):
-                del lst[lst.index(key)]
-                lst.insert(new, key)
-        return lst
+        return list(self.field_order())
 
     def _hex(self, flags):
         return self._hexify(self._data)
@@ -100,11 +288,115 @@ class _SrddlInternal(AbstractMappedValue):
         pass
 
     def _apply_all(self, res, item, fn=lambda x: x):
-        for field_name in self._fields:
-            res += fn(self.namespace[field_name].__get__(self.instance)[item])
+        for field_name in self['fields']:
+            res += fn(self.field(field_name).__get__(self.instance)[item])
         return res
 
 
+def dependencies(klass):
+    '''
+    Returns the dependency graph of the fields of the structure class
+    ``klass``, computed from the references of the fields (see
+    :meth:`srddl.core.fields.AbstractField.references`): a dict from the index
+    of a field to the indices of the fields referencing it, and the indices of
+    the fields referencing functions, which may depend on any field.
+    '''
+    res = klass.__dict__.get('_srddl_dependencies')
+    if res is None:
+        direct, dynamic = collections.defaultdict(set), set()
+        for idx, field in enumerate(klass._srddl_fields):
+            for ref in field.references():
+                if isinstance(ref, AbstractField):
+                    ref_idx = klass._srddl_indices.get(ref)
+                    if ref_idx is not None:
+                        direct[ref_idx].add(idx)
+                elif ref is not None and not isinstance(ref, int):
+                    dynamic.add(idx)
+        res = (dict(direct), frozenset(dynamic))
+        type.__setattr__(klass, '_srddl_dependencies', res)
+    return res
+
+
+class _StaticLayout:
+    '''
+    When all the fields of a structure have a static format (see
+    :meth:`srddl.core.fields.AbstractField.static_format`), the structure is
+    compiled into a single :class:`struct.Struct`. Offsets of the fields are
+    computed once, and mapping the structure only unpacks it with one call to
+    ``unpack_from``.
+    '''
+
+    def __init__(self, endianess, fields):
+        self.struct = struct.Struct(endianess + ''.join(f[2] for f in fields))
+        self.size, self.fields, idx, offset = self.struct.size, [], 0, 0
+        self.endianess = endianess
+        for field_name, field, frmt in fields:
+            count = sch.format_count(frmt)
+            self.fields.append((field_name, field, Offset(offset),
+                                idx if count else None))
+            idx, offset = idx + count, offset + sch.format_size(frmt)
+
+    @staticmethod
+    def compile(klass):
+        '''
+        Returns the layout of the structure class, or None if it can't be
+        compiled.
+        '''
+        if klass._pre_mapping is not Struct._pre_mapping:
+            return None
+        endianess, fields = None, []
+        for field_name, field in zip(klass._srddl_order, klass._srddl_fields):
+            frmt = field.static_format()
+            if frmt is None:
+                return None
+            if frmt[:1] in ['<', '>', '!']:
+                # Network byte order is big-endian.
+                e, frmt = frmt[0].replace('!', '>'), frmt[1:]
+                if sch.format_size(frmt) != 1:
+                    if endianess not in [None, e]:
+                        return None
+                    endianess = e
+            fields.append((field_name, field, frmt))
+        return _StaticLayout(endianess or '<', fields)
+
+    def map_struct(self, srddl):
+        instance, offset = srddl.instance, srddl['offset']
+        values = srddl['data'].unpack_from(self.struct, offset.byte)
+        for field_name, field, field_offset, idx in self.fields:
+            value = None if idx is None else values[idx]
+            field.initialize_unpacked(instance, offset + field_offset, value,
+                                      path=field_name)
+        srddl.mapped, srddl.next_offset = len(self.fields), offset + self.size
+
+
+class _FieldAccessor:
+    '''
+    Descriptor generated by :class:`_MetaStruct` for each field of a structure,
+    in place of the field itself. It fetches the bound value directly in the
+    state of the structure, and only calls the field (which may have been
+    replaced for this instance) when it is not mapped yet. On the class, it
+    returns the field.
+    '''
+
+    __slots__ = ('field', 'idx', 'slot')
+
+    def __init__(self, field, idx):
+        self.field, self.idx = field, idx
+        self.slot = 2 * idx + FieldState.BOUNDVALUE
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.field
+        srddl = instance._srddl
+        res = srddl.state[self.slot]
+        if res is None:
+            res = srddl.fields[self.idx].__get__(instance)
+        return res
+
+    def __set__(self, instance, value):
+        instance._srddl.fields[self.idx].__set__(instance, value)
+
+
 class _MetaStruct(type):
     '''This MetaStruct is needed for several things:
 
@@ -112,31 +404,62 @@ class _MetaStruct(type):
     - It will also verify that certain constraints on structures are not broken,
     so that algorithms don't have to bother checking afterwards when using them.
 
-    It would be cool to check if we can add __slots__ attribute automatically to
-    structures. Indeed a structure souldn't change, and we may create a lot of
-    instances.
+    - A structure created with the ``slots=True`` keyword (this mode is then
+    inherited by its sub-classes) gets an empty ``__slots__`` attribute
+    automatically, unless it defines one. Indeed a structure shouldn't change,
+    and we may create a lot of instances, so they don't need a ``__dict__``.
+
+    - A structure created with the ``lazy=True`` keyword (also inherited) is
+    not mapped when it is created. Its fields are mapped when they, or a field
+    after them, are first accessed, and its size is only computed when it is
+    requested. Errors in the data are then only raised at that time.
+
+    - Each field is replaced in the class by a :class:`_FieldAccessor`, so
+    accessing a field is a plain attribute lookup.
     '''
 
     @classmethod
     def __prepare__(metacls, name, bases, **kwds):
         return collections.OrderedDict()
 
-    def __new__(cls, name, bases, namespace, **kwds):
+    def __new__(cls, name, bases, namespace, slots=None, lazy=None, **kwds):
+        if slots is None:
+            slots = any(getattr(base, '_srddl_slotted', False)
+                        for base in bases)
+        if lazy is None:
+            lazy = any(getattr(base, '_srddl_lazy', False) for base in bases)
         kwds = dict(namespace)
-
-        # Wrap init with a function to manage namespaces.
-        __init__ = kwds.get('__init__')
-        if __init__ is not None:
-            @functools.wraps(__init__)
-            def init_wrapper(self, *args, **kwargs):
-                __init__(self, *args, **kwargs)
-                self._srddl.add_namespace(namespace)
-        else:
-            def init_wrapper(self, *args, **kwargs):
-                bases[0].__init__(self, *args, **kwargs)
-                self._srddl.add_namespace(namespace)
-        kwds['__init__'] = init_wrapper
-        return super().__new__(cls, name, bases, kwds)
+        if slots:
+            kwds.setdefault('__slots__', ())
+        kwds['_srddl_slotted'], kwds['_srddl_lazy'] = slots, lazy
+
+        res = super().__new__(cls, name, bases, kwds)
+
+        # The fields of the structure are computed once for the class, with
+        # fields redefined by a sub-class keeping the place of the original.
+        fields = collections.OrderedDict()
+        for base in reversed(res.__mro__):
+            for field_name, field in vars(base).items():
+                if isinstance(field, _FieldAccessor):
+                    field = field.field
+                if isinstance(field, AbstractField):
+                    fields[field_name] = field
+        res._srddl_order = tuple(fields.keys())
+        res._srddl_fields = tuple(fields.values())
+        res._srddl_names = dict((n, i) for i, n in enumerate(res._srddl_order))
+        res._srddl_indices = dict(
+            (f, i) for i, f in enumerate(res._srddl_fields)
+        )
+        for field_name, field in fields.items():
+            idx = res._srddl_names[field_name]
+            type.__setattr__(res, field_name, _FieldAccessor(field, idx))
+        res._srddl_layout = None if not bases else _StaticLayout.compile(res)
+        res._srddl_static_size = None
+        if bases:
+            sizes = [field.static_size() for field in res._srddl_fields]
+            if None not in sizes:
+                res._srddl_static_size = sum(sizes, Size())
+        return res
 
     def __call__(self, *args, **kwargs):
         res = super().__call__(*args, **kwargs)
@@ -145,6 +468,8 @@ class _MetaStruct(type):
 
 
 class Struct(metaclass=_MetaStruct):
+    __slots__ = ('_srddl', '__weakref__')
+
     def __init__(self, data, offset):
         if not isinstance(data, sd.Data):
             raise se.NotOnDataError(self)
@@ -166,6 +491,16 @@ class Struct(metaclass=_MetaStruct):
     def __getitem__(self, item):
         return self._srddl[item]
 
+    @classmethod
+    def static_size(cls):
+        '''
+        Returns the size of the structures of this class when it never depends
+        on the data (all the fields have a static size, see
+        :meth:`srddl.core.fields.AbstractField.static_size`), or None. It
+        needs neither an instance nor data.
+        '''
+        return cls._srddl_static_size
+
     def _setup(self, data):
         '''
         This function permits to map other structures to different part of
@@ -190,19 +525,6 @@ class Struct(metaclass=_MetaStruct):
         '''
         return []
 
-    def __getattribute__(self, name):
-        # Infinite depth recursion fix.
-        if name in ['_srddl']:
-            return super().__getattribute__(name)
-        if name in self._srddl.namespace:
-            return self._srddl.namespace[name].__get__(self)
-        return super().__getattribute__(name)
-
-    def __setattribute__(self, name, value):
-        if name in self._srddl.namespace:
-            return self._srddl.namespace[name].__set__(self, value)
-        return super().__setattribute__(name, value)
-
 
 class FileType(sch.MetaConf, metaclass=abc.ABCMeta):
     class MetaBase:
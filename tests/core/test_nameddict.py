@@ -40,10 +40,27 @@ class F(C):
     ('prop1:f1', 1),
     ('prop1:f2', 2),
     ('prop1:f1,f2', 0),
+    ('prop1:f2, f1', 0),
+    ('prop1: f1,', 1),
 ])
 def test_property_get(attr, val):
     a = A()
     assert(a[attr] == val)
+    assert(a[attr] == val)
+
+def test_dispatch_table():
+    names = {'prop1', 'prop1:f1', 'prop1:f2', 'prop1:f1,f2'}
+    assert(set(A.__nd_table__) >= names)
+    assert('prop2' not in A.__nd_table__)
+    assert('prop2' not in C.__nd_table__)
+    assert('prop2' in F.__nd_table__)
+    assert(F(2)['prop2'] == 2)
+
+def test_instance_override():
+    a = A()
+    a._prop1 = 'value'
+    assert(a['prop1'] == 'value')
+    assert(a['prop1:f1'] == 'value')
 
 def test_unknown_property():
     a = A()
@@ -96,3 +113,44 @@ def test_override_cant_copy():
             @property
             def _prop1(self):
                 pass
+
+class G(scnd.NamedDict, slots=True):
+    class Meta:
+        init_props = ['prop1', 'prop3']
+
+    @scnd.property(flags=['f1'])
+    def _prop1(self, flags):
+        return 1 if flags['f1'] else 0
+
+    @scnd.abstractproperty()
+    def _prop3(self, flags):
+        pass
+
+def test_slotted_no_dict():
+    g = G(prop3=1)
+    assert(not hasattr(g, '__dict__'))
+    assert('_prop3' in G.__slots__)
+
+@pytest.mark.parametrize(('args', 'prop1', 'prop3'), [
+    ([None, 2], None, 2),
+    ([4, 2], 4, 2),
+])
+def test_slotted_init_props(args, prop1, prop3):
+    g = G(*args)
+    assert(g['prop1'] == prop1)
+    assert(g['prop3'] == prop3)
+
+def test_slotted_default_property():
+    g = G(prop3=2)
+    assert(g['prop1:f1'] == 1)
+
+def test_slotted_abstract_instanciation():
+    with pytest.raises(sce.NamedDictAbstractPropertyError):
+        g = G(prop1=2)
+
+def test_slotted_inherited():
+    class H(G):
+        pass
+    h = H(prop3=3)
+    assert(not hasattr(h, '__dict__'))
+    assert(h['prop3'] == 3)
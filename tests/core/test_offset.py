@@ -45,3 +45,33 @@ def test_sub_offset(a, b, c):
 ])
 def test_rounded(obj, res):
     assert(obj.rounded() == res)
+
+@pytest.mark.parametrize(('a', 'b', 'c'), [
+    (3, Offset(byte=1), Offset(byte=2)),
+    (3, Offset(byte=1, bit=2), Offset(byte=1, bit=6)),
+])
+def test_rsub_offset(a, b, c):
+    assert((a - b) == c)
+
+@pytest.mark.parametrize(('a', 'b'), [
+    (Offset(), Offset(bit=1)),
+    (Offset(byte=1, bit=7), Offset(byte=2)),
+    (Offset(byte=1), 2),
+    (Size(byte=-1), 0),
+])
+def test_compare_offset(a, b):
+    assert(a < b and a <= b and b > a and b >= a and a != b)
+
+@pytest.mark.parametrize(('a', 'b'), [
+    (Offset(byte=2), Size(byte=2)),
+    (Offset(byte=2), 2),
+    (Offset(bit=17), Offset(byte=2, bit=1)),
+])
+def test_hash_offset(a, b):
+    assert(a == b)
+    assert(hash(a) == hash(b))
+    assert(b in {a: None})
+
+def test_offset_immutable():
+    with pytest.raises(AttributeError):
+        Offset().byte = 2
@@ -1,5 +1,8 @@
+import struct
+
 import pytest
 
+import srddl.core.helpers as sch
 import srddl.data as sd
 import srddl.fields as sf
 import srddl.models as sm
@@ -15,3 +18,75 @@ def test_arrayfield(args, kwargs, buf):
     assert(foo.bar['size'] == args[0])
     for it in range(args[0]):
         assert(foo.bar[it] == (0x42 + it))
+
+class Point(sm.Struct):
+    x = sf.IntField(size=sf.IntField.Size.INT16)
+    y = sf.IntField(size=sf.IntField.Size.INT16,
+                    endianess=sf.IntField.Endianess.LITTLE)
+    name = sf.ByteArrayField(2)
+
+class Packed(sm.Struct):
+    count = sf.IntField()
+    ints = sf.ArrayField(count, sf.IntField(size=sf.IntField.Size.INT16))
+    points = sf.ArrayField(2, sf.SuperField(Point))
+
+PACKED = bytes.fromhex('02' + '01000200' + '010002006162' + '030004006364')
+
+@pytest.fixture(params=[False, True])
+def numpy_on(request, monkeypatch):
+    if request.param and not sch.NUMPY_ON:
+        pytest.skip('NumPy is not available.')
+    monkeypatch.setattr(sch, 'NUMPY_ON', request.param)
+    return request.param
+
+def test_arrayfield_packed(numpy_on):
+    packed = Packed(sd.Data(PACKED), 0)
+    assert(isinstance(packed.ints['value'], sf.PackedArray))
+    assert(packed.ints['size'] == 4)
+    assert(packed['size'] == 17)
+    assert(list(packed.ints) == [1, 2])
+    assert(packed.ints[-1] == 2)
+    assert(packed.ints[1]['offset'] == 3)
+    assert(type(packed.ints[0]['value']) is int)
+    assert([p.name['value'] for p in packed.points] == [b'ab', b'cd'])
+    assert(packed.points[1].y == 4)
+
+def test_arrayfield_packed_values(numpy_on):
+    packed = Packed(sd.Data(PACKED), 0)
+    assert(list(packed.ints['value'].values) == [1, 2])
+    points = packed.points['value'].values
+    if numpy_on:
+        assert(list(points['y']) == [2, 4])
+    else:
+        assert(points == [(1, 2, b'ab'), (3, 4, b'cd')])
+
+def test_arrayfield_packed_truncated():
+    with pytest.raises(struct.error):
+        Packed(sd.Data(PACKED[:-1]), 0)['size']
+    with pytest.raises(struct.error):
+        sd.Data(PACKED[:6]).map(0, Packed)
+
+def test_arrayfield_packed_index_unpacks_element(numpy_on):
+    packed = Packed(sd.Data(PACKED), 0)
+    assert(packed.ints[1] == 2)
+    assert(packed.ints['value']._values is None)
+    assert(list(packed.ints) == [1, 2])
+    assert(packed.ints['value']._values is not None)
+
+class Flags(sm.Struct):
+    a = sf.BitField(3)
+    b = sf.BitField(5)
+    c = sf.IntField()
+
+class FlagsArray(sm.Struct):
+    flags = sf.ArrayField(10 ** 7, sf.SuperField(Flags))
+
+def test_arrayfield_static():
+    flags = FlagsArray(sd.Data(bytes.fromhex('2104' + '4206')), 0)
+    value = flags.flags['value']
+    assert(isinstance(value, sf.StaticArray))
+    assert(flags['size'] == 2 * 10 ** 7)
+    assert(value.offset(10 ** 6) == 2 * 10 ** 6)
+    assert(flags.flags[1].b['value'] == 8)
+    assert(flags.flags[1].c == 6)
+    assert(list(value._fields) == [1])
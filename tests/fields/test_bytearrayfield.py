@@ -1,3 +1,5 @@
+import struct
+
 import pytest
 
 import srddl.data as sd
@@ -15,3 +17,37 @@ def test_bytearrayfield(args, kwargs, buf, expected):
     foo = Foo(sd.Data(bytes.fromhex(buf)), 0)
     assert(foo.bar == expected)
     assert(foo.bar['size'] == len(expected))
+
+class Payload(sm.Struct):
+    length = sf.IntField()
+    static = sf.ByteArrayField(2)
+    payload = sf.ByteArrayField(length)
+    bits = sf.BitField(4)
+
+@pytest.mark.parametrize('name', ['static', 'payload'])
+def test_bytearrayfield_zero_copy(name):
+    buf = bytearray.fromhex('0242434445ff')
+    foo = Payload(sd.Data(buf, zero_copy=True), 0)
+    value = getattr(foo, name)['value']
+    assert(isinstance(value, memoryview) and value.readonly)
+    assert(value == bytes.fromhex({'static': '4243', 'payload': '4445'}[name]))
+    buf[3] = 0x00
+    assert(foo.payload['value'] == b'\x00\x45')
+
+def test_bytearrayfield_zero_copy_raw():
+    foo = Payload(sd.Data(bytes.fromhex('0242434445ff'), zero_copy=True), 0)
+    assert(isinstance(foo.payload['raw'], memoryview))
+    assert(foo.payload['hex'] == b'4445')
+    assert(isinstance(foo.bits['raw'], bytearray))
+
+def test_bytearrayfield_zero_copy_too_short():
+    foo = Payload(sd.Data(bytes.fromhex('0842434445'), zero_copy=True), 0)
+    with pytest.raises(struct.error):
+        foo.payload['value']
+
+@pytest.mark.parametrize('zero_copy', [False, True])
+def test_bytearrayfield_display_value(zero_copy):
+    data = sd.Data(bytes.fromhex('0242434445ff'), zero_copy=zero_copy)
+    foo = Payload(data, 0)
+    assert(foo.payload['display_value'] == "b'DE'")
+    assert("payload = b'DE'," in foo['display_value'])
@@ -1 +1,91 @@
-# LALA
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+
+class Foo(sm.Struct):
+    length = sf.IntField()
+    data = sf.ArrayField(length, sf.IntField())
+    tail = sf.IntField()
+    other = sf.IntField()
+
+class Header(sm.Struct):
+    caplen = sf.IntField()
+
+class Packet(sm.Struct):
+    hdr = sf.SuperField(Header)
+    payload = sf.ByteArrayField(lambda s: s.hdr.caplen)
+    end = sf.IntField()
+
+class Chunk(sm.Struct):
+    length = sf.IntField()
+    data = sf.ByteArrayField(length)
+    tail = sf.IntField()
+
+class Outer(sm.Struct):
+    magic = sf.IntField()
+    c = sf.SuperField(Chunk)
+    after = sf.IntField()
+
+class Switch(sm.Struct):
+    kind = sf.IntField()
+    bar = sf.SwitchField(kind, {
+        0: sf.IntField(size=sf.IntField.Size.INT16),
+        1: sf.ByteArrayField(3),
+    })
+    end = sf.IntField()
+
+def test_dependencies():
+    direct, dynamic = sm.dependencies(Foo)
+    assert(direct == {0: {1}})
+    assert(dynamic == frozenset())
+    assert(sm.dependencies(Packet) == ({}, frozenset([1])))
+    assert(sm.dependencies(Switch)[0] == {0: {1}})
+
+def test_array_size_write():
+    data = sd.Data(bytearray.fromhex('0242434445'))
+    foo = data.map(0, Foo)
+    length = foo.length
+    assert(foo.tail == 0x44)
+    foo.length = 3
+    assert(foo.length is length)
+    assert([it['value'] for it in foo.data] == [0x42, 0x43, 0x44])
+    assert(foo.tail == 0x45)
+    assert(foo['size'] == 6)
+    assert(data.mapped.at(5) == [foo])
+
+def test_nested_write():
+    data = sd.Data(bytearray.fromhex('01aabbcc'))
+    packet = data.map(0, Packet)
+    assert(packet.payload['value'] == b'\xaa')
+    assert(data.mapped.at(3) == [])
+    packet.hdr['value'].caplen = 2
+    assert(packet.payload['value'] == b'\xaa\xbb')
+    assert(packet.end == 0xcc)
+    assert(data.mapped.at(3) == [packet])
+
+def test_nested_field_reference_write():
+    data = sd.Data(bytearray.fromhex('ff01aa0b0c0d0e'))
+    outer = data.map(0, Outer)
+    assert(outer.after == 0x0c)
+    outer.c['value'].length = 3
+    assert(outer.c['value'].data['value'] == b'\xaa\x0b\x0c')
+    assert(outer.c['size'] == 5)
+    assert(outer.after['offset'] == 6)
+    assert(outer.after == 0x0e)
+    assert(outer['size'] == 7)
+
+def test_switch_write():
+    data = sd.Data(bytearray.fromhex('004243444546'))
+    switch = data.map(0, Switch)
+    assert(switch.bar == 0x4342)
+    switch.kind = 1
+    assert(switch.bar == b'\x42\x43\x44')
+    assert(switch.end == 0x45)
+
+def test_unrelated_write():
+    data = sd.Data(bytearray.fromhex('0242434445'))
+    foo = data.map(0, Foo)
+    tail = foo.tail
+    foo.other = 1
+    assert(foo.tail is tail)
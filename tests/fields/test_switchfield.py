@@ -0,0 +1,34 @@
+import pytest
+
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+
+class Foo(sm.Struct):
+    kind = sf.IntField()
+    bar = sf.SwitchField(kind, {
+        0: sf.IntField(size=sf.IntField.Size.INT16),
+        1: sf.ByteArrayField(2),
+        sf.SwitchField.DEFAULT: sf.IntField(),
+    })
+    end = sf.IntField()
+
+@pytest.mark.parametrize(('buf', 'expected', 'size'), [
+    ('00424344', 0x4342, 4),
+    ('01424344', b'\x42\x43', 4),
+    ('02424344', 0x42, 3),
+])
+def test_switchfield(buf, expected, size):
+    foo = Foo(sd.Data(bytes.fromhex(buf)), 0)
+    assert(foo.bar == expected)
+    assert(foo['size'] == size)
+
+def test_switchfield_instances():
+    data = sd.Data(bytes.fromhex('0042434401424344'))
+    foo1, foo2 = Foo(data, 0), Foo(data, 4)
+    assert(foo1.bar == 0x4342)
+    assert(foo2.bar == b'\x42\x43')
+    assert(foo1.end == 0x44)
+    assert(foo2.end == 0x44)
+    assert(isinstance(Foo.bar, sf.SwitchField))
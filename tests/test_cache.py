@@ -0,0 +1,61 @@
+import os
+import struct
+
+import pytest
+
+import srddl.cache as scache
+import srddl.data as sd
+
+from srddl.filetypes.pcap import Pcap, PcapFileHeader, PcapPacket
+
+def _packet(payload):
+    return struct.pack('<IIII', 0, 0, len(payload), len(payload)) + payload
+
+PCAP = (bytes.fromhex('d4c3b2a1') + bytes(20) + _packet(b'abc') +
+        _packet(b'') + _packet(b'defgh'))
+
+@pytest.fixture
+def filename(tmp_path):
+    res = str(tmp_path / 'test.pcap')
+    with open(res, 'wb') as f:
+        f.write(PCAP)
+    return res
+
+def _entries(data):
+    return [(k, o.byte, s.byte) for k, o, s in data.mapped.entries()]
+
+def test_cache(filename):
+    data = sd.FileData(filename)
+    assert(not scache.setup(Pcap(), data))
+    assert(os.path.exists(scache.cache_path(filename)))
+    expected = _entries(data)
+    assert(expected == [(PcapFileHeader, 0, 24), (PcapPacket, 24, 19),
+                        (PcapPacket, 43, 16), (PcapPacket, 59, 21)])
+
+    data = sd.FileData(filename)
+    assert(scache.setup(Pcap(), data))
+    assert(_entries(data) == expected)
+    assert(all(s.struct is None for s in data.mapped._structs))
+    assert([s['offset'].byte for s in data.mapped.at(60)] == [59])
+    assert(data.mapped[59].payload['value'] == b'defgh')
+    assert(data.mapped[0].magic['value'] == 0xa1b2c3d4)
+
+def test_cache_invalidated(filename):
+    scache.setup(Pcap(), sd.FileData(filename))
+    st = os.stat(filename)
+    with open(filename, 'r+b') as f:
+        f.seek(len(PCAP) - 1)
+        f.write(b'X')
+    # Same size and modification time: the sampled blocks differ.
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+    data = sd.FileData(filename)
+    assert(not scache.setup(Pcap(), data))
+    assert(data.mapped[59].payload['value'] == b'defgX')
+
+@pytest.mark.parametrize('raw', [b'', b'SRDDLMAP' + bytes(8), b'garbage' * 10])
+def test_cache_corrupted(filename, raw):
+    with open(scache.cache_path(filename), 'wb') as f:
+        f.write(raw)
+    data = sd.FileData(filename)
+    assert(not scache.setup(Pcap(), data))
+    assert(len(_entries(data)) == 4)
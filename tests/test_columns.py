@@ -0,0 +1,63 @@
+import pytest
+
+import srddl.core.helpers as sch
+import srddl.data as sd
+import srddl.exceptions as se
+import srddl.fields as sf
+import srddl.models as sm
+
+
+class Header(sm.Struct):
+    kind = sf.IntField(values=[sf.Value(1, 'ONE')])
+    length = sf.IntField(size=sf.IntField.Size.INT16,
+                         endianess=sf.IntField.Endianess.BIG)
+
+class Packet(sm.Struct):
+    header = sf.SuperField(Header)
+    flags = sf.BitMaskField(values=[sf.Value(1, 'A')])
+    payload = sf.ByteArrayField(lambda s: s.header.length)
+    tail = sf.IntField()
+
+class File(sm.Struct):
+    headers = sf.ArrayField(2, sf.SuperField(Header))
+    count = sf.IntField()
+    packets = sf.ArrayField(count, sf.SuperField(Packet))
+
+BUF = bytes.fromhex('010002' + '010001036101' + '0200020362630a')
+
+@pytest.fixture(params=[False, True])
+def numpy_on(request, monkeypatch):
+    if request.param and not sch.NUMPY_ON:
+        pytest.skip('NumPy is not available.')
+    monkeypatch.setattr(sch, 'NUMPY_ON', request.param)
+    return request.param
+
+def test_data_columns(numpy_on):
+    data = sd.Data(BUF)
+    data.map_array(3, 2, Packet)
+    data.map(0, Header)
+    columns = data.columns(Packet)
+    assert(list(columns) == ['header.kind', 'header.length', 'flags',
+                             'payload', 'tail'])
+    assert(list(columns['header.kind']) == [1, 2])
+    assert(list(columns['header.length']) == [1, 2])
+    assert(list(columns['flags']) == [3, 3])
+    assert(columns['payload'] == [b'a', b'bc'])
+    assert(list(columns['tail']) == [1, 0x0a])
+    assert(list(data.columns(Header)['length']) == [2])
+
+def test_data_columns_empty(numpy_on):
+    columns = sd.Data(BUF).columns(Header)
+    assert(len(columns['kind']) == 0)
+
+def test_array_columns(numpy_on):
+    data = sd.Data(bytes.fromhex('010002030004' + '01' + '0200020362630a'))
+    f = File(data, 0)
+    assert(list(f.headers.columns()['length']) == [2, 4])
+    assert(list(f.packets.columns()['payload']) == [b'bc'])
+
+def test_array_columns_not_structs():
+    class Ints(sm.Struct):
+        ints = sf.ArrayField(2, sf.IntField())
+    with pytest.raises(se.NotAStructArrayError):
+        Ints(sd.Data(b'\x00\x00'), 0).ints.columns()
@@ -0,0 +1,461 @@
+import bz2
+import gc
+import gzip
+import lzma
+import os
+import struct
+import weakref
+import zlib
+
+import pytest
+
+import srddl.data as sd
+import srddl.exceptions as se
+import srddl.fields as sf
+import srddl.models as sm
+
+
+class Chunk(sm.Struct):
+    length = sf.IntField()
+    data = sf.ByteArrayField(length)
+
+BUF = bytes.fromhex('0161' + '026263' + '00' + '03646566')
+
+def test_iter_array():
+    data, index = sd.Data(BUF), sd.OffsetIndex()
+    chunks = data.iter_array(0, 3, Chunk, index=index)
+    assert([c.data['value'] for c in chunks] == [b'a', b'bc', b''])
+    assert(not data.mapped)
+    assert(list(index) == [(0, 2), (2, 3), (5, 1)])
+
+def test_iter_fill_array():
+    data, index = sd.Data(BUF + b'\x05'), sd.OffsetIndex()
+    chunks = list(data.iter_fill_array(0, -1, Chunk, index=index))
+    assert(len(chunks) == 5)
+    assert(len(index) == 5)
+    assert(index[3] == (6, 4))
+    assert(index[4] == (10, 6))
+
+def test_iter_array_releases_structures():
+    refs = [weakref.ref(c) for c in sd.Data(BUF).iter_array(0, 3, Chunk)]
+    gc.collect()
+    assert(all(ref() is None for ref in refs))
+
+@pytest.mark.parametrize(('offset', 'idx'), [
+    (0, 0), (1, 0), (2, 1), (5, 2), (6, 3), (9, 3), (10, None), (-1, None),
+])
+def test_offset_index_find(offset, idx):
+    data, index = sd.Data(BUF), sd.OffsetIndex()
+    list(data.iter_fill_array(0, -1, Chunk, index=index))
+    assert(index.find(offset) == idx)
+
+class Header(sm.Struct):
+    magic = sf.IntField(size=sf.IntField.Size.INT16)
+    chunks = sf.ArrayField(2, sf.SuperField(Chunk))
+
+HEADER = bytes.fromhex('4142' + '0161' + '026263')
+
+def test_mapped_data_order():
+    data = sd.Data(BUF)
+    for offset in [5, 0, 2]:
+        data.map(offset, Chunk)
+    assert([k.byte for k in data.mapped.keys()] == [0, 2, 5])
+    assert([o.byte for o, _ in data.mapped.ordered()] == [0, 2, 5])
+    del data.mapped[2]
+    assert([k.byte for k in data.mapped.keys()] == [0, 5])
+
+@pytest.mark.parametrize(('offset', 'expected'), [
+    (0, [0]), (1, [0]), (2, [2]), (4, [2]), (5, []), (6, [6]), (9, [6]),
+    (10, []),
+])
+def test_mapped_data_at(offset, expected):
+    data = sd.Data(BUF)
+    for it in [6, 0, 2]:
+        data.map(it, Chunk)
+    assert([s['offset'].byte for s in data.mapped.at(offset)] == expected)
+
+def test_mapped_data_overlapping():
+    data = sd.Data(HEADER)
+    header, chunk = data.map(0, Header), data.map(4, Chunk)
+    assert(data.mapped.at(5) == [header, chunk])
+    assert(data.mapped.between(0, 4) == [header])
+    assert(data.mapped.between(3, 7) == [header, chunk])
+    assert(data.mapped.between(7) == [])
+
+def test_mapped_data_fields_at():
+    data = sd.Data(HEADER)
+    header = data.map(0, Header)
+    path = data.mapped.fields_at(5)[0]
+    assert(path[0] is header)
+    assert([bv['offset'].byte for bv in path[1:]] == [2, 4, 5])
+    assert(path[-1]['value'] == b'bc')
+    assert(data.mapped.fields_at(1)[0][1:] == [header.magic])
+
+class Record(sm.Struct):
+    a = sf.IntField(size=sf.IntField.Size.INT16)
+
+def test_mapped_data_lookup():
+    data = sd.Data(BUF)
+    chunk = data.map(0, Chunk)
+    assert(data.mapped.lookup(0) is chunk)
+    assert(data.mapped.lookup(1) is None)
+    assert(data.mapped.lookup((0, lambda s: False), chunk) is chunk)
+    with pytest.raises(KeyError):
+        data.mapped[1]
+
+@pytest.mark.parametrize(('buf', 'count'), [
+    (bytes(6), 3), (bytes(7), 3), (bytes(1), 0),
+])
+def test_map_fill_array_bounds(buf, count):
+    data = sd.Data(buf)
+    data.map_fill_array(0, -1, Record)
+    assert(len(list(data.mapped.ordered())) == count)
+    assert(len(list(sd.Data(buf).iter_fill_array(0, -1, Record))) == count)
+
+CHUNKS = bytes.fromhex('0161' + '026263' + '00' + '03646566') * 3
+
+@pytest.mark.parametrize('step', [1, 2, 5, 100])
+def test_checkpoint_index(step):
+    data, index = sd.Data(CHUNKS), sd.CheckpointIndex(step)
+    offsets = sd.OffsetIndex()
+    for s in data.iter_fill_array(0, -1, Chunk, index=index):
+        offsets.append(s['offset'], s['size'])
+    assert(len(index) == 12)
+    assert(index.end == len(CHUNKS))
+    assert(len(index.offsets) == (12 + step - 1) // step)
+    for idx, (offset, _) in enumerate(offsets):
+        assert(index.locate(data, Chunk, idx) == offset)
+    assert(index.locate(data, Chunk, -1) == offsets[-1][0])
+    with pytest.raises(IndexError):
+        index.locate(data, Chunk, 12)
+
+def test_checkpoint_index_map_fill_array():
+    data, index = sd.Data(CHUNKS), sd.CheckpointIndex(4)
+    data.map_fill_array(0, -1, Chunk, index=index)
+    assert(list(index.offsets) == [0, 10 * 8, 20 * 8])
+    assert(data.mapped[index.locate(data, Chunk, 6)].data['value'] == b'')
+
+def test_checkpoint_index_serialization():
+    data, index = sd.Data(CHUNKS), sd.CheckpointIndex(3)
+    data.map_fill_array(0, -1, Chunk, index=index)
+    loaded = sd.CheckpointIndex.frombytes(index.tobytes())
+    assert((loaded.step, len(loaded), loaded.end) == (3, 12, len(CHUNKS)))
+    assert(loaded.offsets == index.offsets)
+    assert(loaded.locate(data, Chunk, 7) == index.locate(data, Chunk, 7))
+
+@pytest.mark.parametrize('raw', [
+    b'', b'SRDDLCKQ' + bytes(28), sd.CheckpointIndex().tobytes() + b'\0',
+])
+def test_checkpoint_index_invalid(raw):
+    with pytest.raises(se.InvalidIndexError):
+        sd.CheckpointIndex.frombytes(raw)
+
+def test_overlay_data_write():
+    data = sd.OverlayData(bytes(range(16)))
+    data.pack_into('<H', 2, 0xffff)
+    data.pack_into('B', 5, 0xee)
+    assert(data.dirty == [(2, 2), (5, 1)])
+    data.pack_into('<H', 4, 0xdddd)
+    assert(data.dirty == [(2, 4)])
+    assert(data.read(0, 8) == bytes.fromhex('0001ffffdddd0607'))
+    assert(data.unpack_from('<I', 3) == (0x06ddddff,))
+    data.pack_into('B', 3, 0xaa)
+    assert(data.dirty == [(2, 4)])
+    assert(data.read(2, 4) == bytes.fromhex('ffaadddd'))
+    assert(bytes(data.slice_from(6, 2)) == b'\x06\x07')
+    assert(data.buffer() is None)
+    with pytest.raises(struct.error):
+        data.pack_into('<I', 14, 0)
+
+def test_overlay_data_undo():
+    data = sd.OverlayData(bytes(BUF))
+    chunk = data.map(0, Chunk)
+    assert(chunk.data['value'] == b'a')
+    chunk.length = 2
+    data.snapshot()
+    chunk.length = 3
+    assert(chunk.data['value'] == b'a\x02b')
+    assert(data.undo())
+    assert(chunk.length == 2)
+    assert(chunk.data['value'] == b'a\x02')
+    assert(data.undo())
+    assert(not data.undo())
+    assert(chunk.data['value'] == b'a')
+    assert(data.mapped.at(2) == [])
+    assert(data.redo() and data.redo())
+    assert(not data.redo())
+    assert(chunk.data['value'] == b'a\x02b')
+    assert(data.mapped.at(3) == [chunk])
+
+def test_overlay_data_save_no_filename(tmpdir):
+    data = sd.OverlayData(bytes(BUF))
+    data.pack_into('B', 1, 0x7a)
+    with pytest.raises(se.NoFilenameError):
+        data.save()
+    data.save(str(tmpdir.join('data.bin')))
+    assert(tmpdir.join('data.bin').read_binary() == b'\x01z' + BUF[2:])
+
+def test_overlay_data_save(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(bytes(BUF))
+    data = sd.OverlayData.from_file(str(path))
+    data.pack_into('B', 1, 0x7a)
+    assert(path.read_binary() == BUF)
+    data.save(str(tmpdir.join('copy.bin')))
+    assert(tmpdir.join('copy.bin').read_binary() == b'\x01z' + BUF[2:])
+    assert(data.dirty == [(1, 1)])
+    data.save()
+    assert(path.read_binary() == b'\x01z' + BUF[2:])
+    assert(data.dirty == [])
+    assert(data.read(0, 2) == b'\x01z')
+
+def test_piece_table_data_edit():
+    data = sd.PieceTableData(bytes(range(16)))
+    data.insert(4, b'\xaa\xbb')
+    data.insert(6, b'\xcc')
+    data.delete(0, 2)
+    assert(len(data) == 17)
+    assert(data.read(0, 6) == bytes.fromhex('0203aabbcc04'))
+    assert(data.unpack_from('>H', 3) == (0xbbcc,))
+    data.pack_into('>H', 4, 0xeeff)
+    assert(data.read(2, 5) == bytes.fromhex('aabbeeff05'))
+    data.delete(2, 3)
+    assert(data.read(0, 4) == bytes.fromhex('0203ff05'))
+    assert(bytes(data.slice_from(4, 2)) == b'\x06\x07')
+    assert(data.buffer() is None)
+    with pytest.raises(struct.error):
+        data.unpack_from('<I', len(data) - 2)
+    with pytest.raises(struct.error):
+        data.unpack_from('B', -1)
+
+def test_piece_table_data_random():
+    import random
+    rnd = random.Random(0)
+    ref = bytearray(range(256)) * 4
+    data = sd.PieceTableData(bytes(ref))
+    for _ in range(500):
+        offset = rnd.randrange(len(ref))
+        if rnd.random() < 0.5:
+            raw = bytes(rnd.randrange(256) for _ in range(rnd.randrange(1, 8)))
+            data.insert(offset, raw)
+            ref[offset:offset] = raw
+        else:
+            size = rnd.randrange(min(8, len(ref) - offset) + 1)
+            data.delete(offset, size)
+            del ref[offset:offset + size]
+    assert(data.read(0, len(data)) == bytes(ref))
+
+def test_piece_table_data_mapped():
+    data = sd.PieceTableData(bytes(BUF))
+    data.map_fill_array(0, -1, Chunk)
+    first, second = data.mapped[0], data.mapped[2]
+    data.insert(1, b'z')
+    assert(first.data['value'] == b'z')
+    assert(data.mapped.lookup(2) is None)
+    assert(data.mapped[3].data['value'] == b'bc')
+    assert(data.mapped[3] is not second)
+    assert([o.byte for o in data.mapped.keys()] == [0, 3, 6, 7])
+    data.delete(3, 3)
+    assert(data.mapped[3].data['value'] == b'')
+    assert([s['offset'] for _, s in data.mapped.ordered()] == [0, 3, 4])
+
+def test_piece_table_data_save(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(bytes(BUF))
+    data = sd.PieceTableData.from_file(str(path))
+    data.insert(2, b'\x01z')
+    data.save()
+    assert(path.read_binary() == BUF[:2] + b'\x01z' + BUF[2:])
+    assert(data.read(0, 4) == BUF[:2] + b'\x01z')
+    with pytest.raises(se.NoFilenameError):
+        sd.PieceTableData(bytes(BUF)).save()
+
+def test_paged_data(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(CHUNKS)
+    data = sd.PagedData(str(path), page_size=4, budget=12, read_ahead=2)
+    assert(len(data) == len(CHUNKS))
+    assert(data.unpack_from('>I', 2) == (0x02626300,))
+    assert(bytes(data.slice_from(20, 3)) == CHUNKS[20:23])
+    chunks = list(data.iter_fill_array(0, -1, Chunk))
+    assert([s.data['value'] for s in chunks] == [b'a', b'bc', b'', b'def'] * 3)
+    assert(len(data._pages) <= 3)
+    with pytest.raises(struct.error):
+        data.unpack_from('>I', len(CHUNKS) - 2)
+    with pytest.raises(se.DataIsROError):
+        data.pack_into('B', 0, 0)
+    data.close()
+
+def test_paged_data_stream():
+    rfd, wfd = os.pipe()
+    os.write(wfd, CHUNKS)
+    os.close(wfd)
+    data = sd.PagedData(rfd, page_size=4, budget=8)
+    assert(data.stream and len(data) > len(CHUNKS))
+    sizes = [s['size'].byte for s in data.iter_fill_array(0, -1, Chunk)]
+    assert(sizes == [2, 3, 1, 4] * 3)
+    assert(len(data) == len(CHUNKS))
+    with pytest.raises(se.PageEvictedError):
+        data.unpack_from('B', 0)
+    os.close(rfd)
+
+def test_file_data_follower(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(BUF[:4])
+    data, batches = sd.FileData(str(path)), []
+    follower = sd.Follower(data, 0, Chunk, batch=2)
+    follower.signals.subscribe('mapped',
+                               lambda structs: batches.append(len(structs)))
+    assert(follower.poll() == 1)
+    assert(len(data) == 4)
+    with open(str(path), 'ab') as f:
+        f.write(BUF[4:])
+    assert(follower.poll() == 3)
+    assert(batches == [1, 2, 1])
+    assert(len(data) == len(BUF))
+    offsets = [s['offset'].byte for _, s in data.mapped.ordered()]
+    assert(offsets == [0, 2, 5, 6])
+    assert(data.mapped[6].data['value'] == b'def')
+    assert(follower.poll() == 0)
+
+@pytest.mark.parametrize(('module', 'suffix'), [
+    (gzip, '.gz'), (bz2, '.bz2'), (lzma, '.xz'),
+])
+def test_compressed_data(tmpdir, module, suffix):
+    path = str(tmpdir.join('data.bin' + suffix))
+    with open(path, 'wb') as f:
+        for idx in range(3):
+            f.write(module.compress(CHUNKS[10 * idx:10 * idx + 10]))
+    data = sd.CompressedData(path, page_size=4, budget=8)
+    codec = module.__name__.replace('lzma', 'xz')
+    assert((data.codec, data.inner_filename) == (codec, path[:-len(suffix)]))
+    assert(len(data) == len(CHUNKS))
+    assert(data.points[1] == (10, len(module.compress(CHUNKS[:10]))))
+    assert(data.unpack_from('>H', 18) == (0x6566,))
+    sizes = [s['size'].byte for s in data.iter_fill_array(0, -1, Chunk)]
+    assert(sizes == [2, 3, 1, 4] * 3)
+    assert(os.path.exists(sd.index_path(path)))
+    loaded = sd.CompressedData(path, page_size=4)
+    assert((len(loaded), loaded.points) == (len(CHUNKS), data.points))
+    assert(loaded.read(5, 20) == CHUNKS[5:25])
+
+def test_compressed_data_gzip_snapshots(tmpdir):
+    raw, path = os.urandom(1 << 16), tmpdir.join('data.gz')
+    path.write_binary(gzip.compress(raw))
+    data = sd.CompressedData(str(path), page_size=16, step=1 << 13)
+    assert(len(data.points) == 1 and len(data._snapshots) > 1)
+    for offset in [50000, 7000, 65000, 0]:
+        assert(data.read(offset, 30) == raw[offset:offset + 30])
+
+def _xz_stream(chunks):
+    # A xz stream with a block by chunk, lzma only writes one block.
+    flags = bytes(2)
+    stream = b'\xfd7zXZ\0' + flags + struct.pack('<I', zlib.crc32(flags))
+    index = bytearray([0, len(chunks)])
+    for chunk in chunks:
+        raw = lzma.compress(chunk, format=lzma.FORMAT_RAW, filters=[
+            {'id': lzma.FILTER_LZMA2, 'dict_size': 1 << 23},
+        ])
+        header = b'\x02\0\x21\x01\x16\0\0\0'
+        stream += header + struct.pack('<I', zlib.crc32(header)) + raw
+        stream += bytes(-len(raw) % 4)
+        index += bytes([12 + len(raw), len(chunk)])
+    index += bytes(-len(index) % 4)
+    index += struct.pack('<I', zlib.crc32(index))
+    footer = struct.pack('<I', len(index) // 4 - 1) + flags
+    footer = struct.pack('<I', zlib.crc32(footer)) + footer + b'YZ'
+    return stream + index + footer
+
+def test_compressed_data_xz_blocks(tmpdir):
+    streams = [_xz_stream([CHUNKS[:10], CHUNKS[10:20], CHUNKS[20:25]]),
+               _xz_stream([CHUNKS[25:27], CHUNKS[27:]])]
+    path = tmpdir.join('data.xz')
+    path.write_binary(streams[0] + bytes(8) + streams[1])
+    assert(b''.join(lzma.decompress(it) for it in streams) == CHUNKS)
+    data = sd.CompressedData(str(path), page_size=4, budget=8)
+    first = len(streams[0]) + 8
+    assert([u for u, _ in data.points] == [0, 10, 20, 25, 27])
+    assert([c for _, c in data.points][3] == first)
+    for offset in [24, 21, 11, 3, 26, 20, 27]:
+        assert(data.read(offset, 6) == CHUNKS[offset:offset + 6])
+    loaded = sd.CompressedData(str(path), page_size=4)
+    assert(loaded.points == data.points)
+    assert(loaded.read(8, 22) == CHUNKS[8:])
+
+def test_compressed_data_no_index(tmpdir):
+    path = str(tmpdir.join('data.gz'))
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(CHUNKS))
+    data = sd.CompressedData(path, index=False)
+    assert(data.index is None and len(data) == len(CHUNKS))
+    assert(not os.path.exists(sd.index_path(path)))
+
+def test_compressed_data_unknown(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(CHUNKS)
+    with pytest.raises(se.UnknownCompressionError):
+        sd.CompressedData(str(path))
+
+def test_sub_data():
+    buf = bytearray(CHUNKS)
+    data = sd.Data(buf)
+    data.map(0, Chunk)
+    sub = data.view(10, 20)
+    assert(len(sub) == 20 and sub.buffer() is not None)
+    sub.map_fill_array(0, -1, Chunk)
+    assert(len(list(sub.mapped.ordered())) == 8)
+    assert(len(list(data.mapped.ordered())) == 1)
+    sub.pack_into('2s', 3, b'xy')
+    assert(buf[13:15] == b'xy')
+    assert(sub.mapped[2].data['value'] == b'xy')
+    inner = sub.view(10, 10)
+    assert(inner.unpack_from('B', 6) == (3,))
+    assert(inner.absolute(6) == 26)
+    with pytest.raises(struct.error):
+        inner.unpack_from('B', 10)
+    with pytest.raises(IndexError) as excinfo:
+        sub.view(15, 10)
+    inner.close()
+    sub.close()
+    # The failed view (still referenced by the traceback) holds no view of
+    # the buffer, so it can be resized.
+    buf.extend(b'\0')
+    assert(excinfo.value is not None)
+
+def test_sub_data_translated():
+    data = sd.PieceTableData(bytes(CHUNKS))
+    sub = data.view(10, 20).view(5, 10)
+    assert((sub.parent, sub.start, sub.buffer()) == (data, 15, None))
+    data.pack_into('B', 16, 0x7a)
+    assert(sub.unpack_from('3s', 0) == (b'\x00\x7a\x64',))
+    assert(bytes(sub.slice_from(2, 2)) == b'de')
+    sub.pack_into('B', 9, 0x42)
+    assert(data.read(24, 1) == b'\x42')
+    with pytest.raises(struct.error):
+        sub.unpack_from('<H', 9)
+
+def test_paged_data_refresh(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(CHUNKS[:9])
+    data = sd.PagedData(str(path), page_size=4, budget=16, read_ahead=3)
+    assert(data.read(0, 9) == CHUNKS[:9])
+    with pytest.raises(struct.error):
+        data.unpack_from('B', 9)
+    with open(str(path), 'ab') as f:
+        f.write(CHUNKS[9:])
+    assert(data.refresh() and not data.refresh())
+    assert(data.read(0, len(CHUNKS)) == CHUNKS)
+
+def test_paged_data_follower(tmpdir):
+    path = tmpdir.join('data.bin')
+    path.write_binary(CHUNKS[:6])
+    data = sd.PagedData(str(path), page_size=4, budget=16, read_ahead=3)
+    follower = sd.Follower(data, 0, Chunk)
+    assert(follower.poll() == 3)
+    for start in [12, len(CHUNKS)]:
+        with open(str(path), 'ab') as f:
+            f.write(CHUNKS[len(data):start])
+        follower.poll()
+    sizes = [s['size'].byte for _, s in data.mapped.ordered()]
+    assert(sizes == [2, 3, 1, 4] * 3)
+    assert(follower.offset == len(CHUNKS))
@@ -0,0 +1,103 @@
+import pytest
+
+import srddl.data as sd
+import srddl.decoders as sdec
+import srddl.exceptions as se
+import srddl.fields as sf
+import srddl.models as sm
+
+
+class Chunk(sm.Struct):
+    pad = sf.PaddingField(1)
+    length = sf.IntField()
+    data = sf.ByteArrayField(length)
+    kind = sf.IntField()
+    extra = sf.SwitchField(kind, {
+        0: sf.IntField(size=sf.IntField.Size.INT16),
+        1: sf.ByteArrayField(lambda s: s.length),
+    })
+
+class File(sm.Struct):
+    flags = sf.BitMaskField(values=[sf.Value(1, 'A'), sf.Value(2, 'B')])
+    count = sf.IntField()
+    chunks = sf.ArrayField(count, sf.SuperField(Chunk))
+    values = sf.ArrayField(2, sf.IntField(size=sf.IntField.Size.INT16))
+
+class Reordered(sm.Struct):
+    a = sf.IntField()
+    b = sf.IntField()
+
+    def _pre_mapping(self, data, lst):
+        return [('b', 0)] if data.unpack_from('B', 0)[0] else []
+
+class ReorderedByValue(sm.Struct):
+    a = sf.IntField()
+    b = sf.IntField()
+    c = sf.ByteArrayField(lambda s: s.a['value'])
+
+    def _pre_mapping(self, data, lst):
+        first = data.unpack_from('B', self['offset'].byte)[0]
+        return [('b', 0)] if first == 2 else []
+
+class Empty(sm.Struct):
+    pass
+
+class Bits(sm.Struct):
+    a = sf.BitField(4)
+    b = sf.BitField(4)
+
+BUF = bytes.fromhex('0302' + '00026162003400' + '0001630163' + '01000200')
+
+def test_decoder_values():
+    rec = sdec.decode(sd.Data(BUF), 0, File)
+    assert(rec._size == len(BUF))
+    assert([v['name'] for v in rec.flags] == ['A', 'B'])
+    assert(rec.count == 2)
+    chunks = [(c.data, c.extra) for c in rec.chunks]
+    assert(chunks == [(b'ab', 0x34), (b'c', b'c')])
+    assert(rec.chunks[1]._offset == 9)
+    assert(rec.values == [1, 2])
+
+def test_decoder_same_as_mapping():
+    struct, rec = File(sd.Data(BUF), 0), sdec.decode(sd.Data(BUF), 0, File)
+    assert(sdec._to_record(struct)._asdict().keys() == rec._asdict().keys())
+    assert(repr(sdec._to_record(struct)) == repr(rec))
+
+def test_decoder_cached():
+    assert(sdec.decoder(File) is sdec.decoder(File))
+    assert(hasattr(sdec.decoder(Chunk), '_source'))
+
+def test_decoder_switch_error():
+    with pytest.raises(se.SwitchFieldError):
+        sdec.decode(sd.Data(bytes.fromhex('0000' + '02')), 0, Chunk)
+
+@pytest.mark.parametrize(('buf', 'a', 'b'), [
+    ('0001', 0x00, 0x01),
+    ('0100', 0x00, 0x01),
+])
+def test_decoder_pre_mapping(buf, a, b):
+    rec = sdec.decode(sd.Data(bytes.fromhex(buf)), 0, Reordered)
+    struct = Reordered(sd.Data(bytes.fromhex(buf)), 0)
+    assert((rec.a, rec.b) == (struct.a['value'], struct.b['value']))
+    key = (Reordered, tuple(struct['fields']))
+    assert(hasattr(sdec._DECODERS[key], '_source'))
+
+@pytest.mark.parametrize(('buf', 'a', 'b', 'c'), [
+    ('0100ff', 0x01, 0x00, b'\xff'),
+    ('02010304', 0x01, 0x02, b'\x03'),
+])
+def test_decoder_pre_mapping_reads_structure(buf, a, b, c):
+    data = sd.Data(bytes.fromhex('ee' + buf))
+    rec = sdec.decode(data, 1, ReorderedByValue)
+    struct = ReorderedByValue(data, 1)
+    assert((rec.a, rec.b, rec.c) == (a, b, c))
+    assert((rec.a, rec.b) == (struct.a['value'], struct.b['value']))
+    assert(rec._size == struct['size'].rounded())
+
+def test_decoder_empty():
+    assert(sdec.decode(sd.Data(b''), 0, Empty)._size == 0)
+
+def test_decoder_fallback():
+    rec = sdec.decode(sd.Data(b'\x21'), 0, Bits)
+    assert(not hasattr(sdec.decoder(Bits), '_source'))
+    assert((rec.a, rec.b, rec._size) == (1, 2, 1))
@@ -0,0 +1,184 @@
+import gc
+import struct
+import weakref
+
+import pytest
+
+import srddl.data as sd
+import srddl.fields as sf
+import srddl.models as sm
+
+
+class Static(sm.Struct):
+    a = sf.IntField()
+    b = sf.IntField(size=sf.IntField.Size.INT16,
+                    values=[sf.Value(0x4443, 'B')])
+    c = sf.ByteArrayField(2)
+    d = sf.PaddingField(1)
+    e = sf.IntField(size=sf.IntField.Size.INT32)
+
+class Nested(sm.Struct):
+    a = sf.SuperField(Static)
+    b = sf.ArrayField(2, sf.IntField())
+
+class Dynamic(sm.Struct):
+    length = sf.IntField()
+    data = sf.ByteArrayField(length)
+
+class MixedEndianess(sm.Struct):
+    a = sf.IntField(size=sf.IntField.Size.INT16)
+    b = sf.IntField(size=sf.IntField.Size.INT16,
+                    endianess=sf.IntField.Endianess.BIG)
+
+class BigEndian(sm.Struct):
+    a = sf.IntField(size=sf.IntField.Size.INT16,
+                    endianess=sf.IntField.Endianess.NETWORK)
+    b = sf.IntField()
+
+BUF = bytes.fromhex('4243444546474849505152')
+
+@pytest.mark.parametrize(('klass', 'compiled'), [
+    (Static, True),
+    (Nested, True),
+    (Dynamic, False),
+    (MixedEndianess, False),
+    (BigEndian, True),
+])
+def test_static_layout_compiled(klass, compiled):
+    assert((klass._srddl_layout is not None) is compiled)
+
+def test_static_layout_values():
+    s = Static(sd.Data(BUF), 0)
+    assert(s.a == 0x42)
+    assert(s.b == 0x4443)
+    assert(s.b['name'] == 'B')
+    assert(s.c == b'\x45\x46')
+    assert(s.e == 0x51504948)
+    assert(s.e['offset'] == 6)
+    assert(s['size'] == 10)
+
+def test_static_layout_nested():
+    n = Nested(sd.Data(BUF + b'\x01\x02'), 1)
+    assert(n['size'] == 12)
+    assert(n.a.a == 0x43)
+    assert(n.a['offset'] == 1)
+    assert(n.b['offset'] == 11)
+    assert(n.b[1] == 0x02)
+
+def test_static_layout_big_endian():
+    b = BigEndian(sd.Data(BUF), 0)
+    assert(b.a == 0x4243)
+    assert(b.b == 0x44)
+
+def test_static_layout_too_short():
+    with pytest.raises(struct.error):
+        Static(sd.Data(BUF[:4]), 0)
+
+class Slotted(sm.Struct, slots=True):
+    a = sf.IntField()
+
+class SlottedChild(Slotted):
+    b = sf.IntField()
+
+@pytest.mark.parametrize(('klass', 'slotted'), [
+    (Static, False),
+    (Slotted, True),
+    (SlottedChild, True),
+])
+def test_slots(klass, slotted):
+    s = klass(sd.Data(BUF), 0)
+    assert(hasattr(s, '__dict__') is not slotted)
+    assert(not hasattr(s.a, '__dict__'))
+    assert(not hasattr(s.a['offset'], '__dict__'))
+    assert(s.a == 0x42)
+
+def test_decoded_value_cached():
+    s = Static(sd.Data(bytearray(BUF)), 0)
+    assert(s.c['value'] is s.c['value'])
+
+@pytest.mark.parametrize(('klass',), [(Static,), (Dynamic,)])
+def test_set_invalidates_value(klass):
+    s = klass(sd.Data(bytearray(BUF)), 0)
+    field_name = s['fields'][0]
+    getattr(s, field_name)['value']
+    getattr(s, field_name).set(0x01)
+    assert(getattr(s, field_name) == 0x01)
+
+def test_set_invalidates_copied_value():
+    s = Static(sd.Data(bytearray(BUF)), 0)
+    assert(s.b['name'] == 'B')
+    s.b.set(0x1234)
+    assert(s.b == 0x1234)
+    assert(s.b['name'] is None)
+
+def test_structures_released_on_close():
+    data = sd.Data(bytearray(BUF))
+    ref = weakref.ref(data.map(0, Slotted))
+    ref().a['value']
+    data.close()
+    gc.collect()
+    assert(ref() is None)
+
+class Child(Static):
+    c = sf.IntField(size=sf.IntField.Size.INT16)
+    f = sf.IntField()
+
+def test_fields_order():
+    assert(Child._srddl_order == ('a', 'b', 'c', 'd', 'e', 'f'))
+    child = Child(sd.Data(BUF[:10] + b'\x01'), 0)
+    assert(child['fields'] == ['a', 'b', 'c', 'd', 'e', 'f'])
+    assert(child.c == 0x4645)
+    assert(child.f == 0x01)
+
+class Lazy(Dynamic, lazy=True):
+    trailer = sf.IntField(size=sf.IntField.Size.INT16)
+
+class LazyNested(sm.Struct, lazy=True):
+    a = sf.SuperField(Lazy)
+    b = sf.IntField()
+
+def test_lazy_mapping():
+    lazy = Lazy(sd.Data(b'\x02abcd'), 0)
+    assert(lazy._srddl.mapped == 0)
+    assert(lazy.data == b'ab')
+    assert(lazy._srddl.mapped == 2)
+    assert(lazy.trailer == 0x6463)
+    assert(lazy.trailer['offset'] == 3)
+    assert(lazy['size'] == 5)
+
+def test_lazy_mapping_errors_deferred():
+    lazy = Lazy(sd.Data(b'\x08abc'), 0)
+    assert(lazy.data['size'] == 8)
+    with pytest.raises(struct.error):
+        lazy.trailer['value']
+
+def test_lazy_mapping_nested():
+    nested = LazyNested(sd.Data(b'\x01ab\x00c'), 0)
+    assert(nested.b == ord('c'))
+    assert(nested.a._srddl.mapped == 3)
+    assert(nested['size'] == 5)
+
+def test_field_accessors():
+    assert(isinstance(Child.__dict__['a'], sm._FieldAccessor))
+    assert(Child.c is Child._srddl_fields[2])
+    assert(isinstance(Child.c, sf.IntField))
+    child = Child(sd.Data(bytearray(BUF[:10] + b'\x01')), 0)
+    child.f = 0x02
+    assert(child.f == 0x02)
+
+class WithBits(sm.Struct):
+    a = sf.BitField(4)
+    b = sf.BitField(12)
+    c = sf.ArrayField(3, sf.SuperField(Static))
+
+@pytest.mark.parametrize(('klass', 'size'), [
+    (Static, sd.Size(10)), (Nested, sd.Size(12)), (WithBits, sd.Size(32)),
+    (Dynamic, None),
+])
+def test_static_size(klass, size):
+    assert(klass.static_size() == size)
+
+def test_map_array_static():
+    data = sd.Data(bytes(40))
+    data.map_array(0, 4, Static)
+    assert([o.byte for o, _ in data.mapped.ordered()] == [0, 10, 20, 30])